@@ -0,0 +1,74 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from recipes.tools import get_version, is_cache_shared
+
+
+class TokenCache:
+    """Process-local LRU of resolved tokens with a bounded lifetime.
+
+    Entries belong to a content version of Token. Once the version
+    changes, e.g. on logout, the whole cache is dropped. Workers see
+    each other's versions only through a shared Django cache.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.version = None
+
+    def get(self, key, version):
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, credentials, version):
+        with self.lock:
+            if version != self.version:
+                return
+            self.entries[key] = (time.monotonic() + self.timeout, credentials)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TIMEOUT
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that skips the token query for known tokens.
+
+    With a process-local default cache a revoked token could stay valid
+    in other workers, so tokens are then read from the database.
+    """
+
+    def authenticate_credentials(self, key):
+        if not is_cache_shared():
+            return super().authenticate_credentials(key)
+        version = get_version(Token)
+        credentials = token_cache.get(key, version)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials, version)
+        user, token = credentials
+        return copy.copy(user), token
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import count_queries, current_query_counter
+
+run_queries_concurrently = ContextVar(
+    'run_queries_concurrently', default=False
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'QUERY_WORKERS', 4),
+    thread_name_prefix='queries'
+)
+
+
+@contextmanager
+def concurrent_queries(enabled=True):
+    token = run_queries_concurrently.set(enabled)
+    try:
+        yield
+    finally:
+        run_queries_concurrently.reset(token)
+
+
+def close_failed_connections():
+    """Close connections of the current thread that cannot be used.
+
+    Pool threads keep their connections open between calls, so each
+    thread connects once and only a connection that failed is replaced.
+    """
+    for connection in connections.all():
+        if connection.connection is None or not connection.errors_occurred:
+            continue
+        if connection.is_usable():
+            connection.errors_occurred = False
+        else:
+            connection.close()
+
+
+def run_in_pool(function):
+    """Call function in a pool thread, counting queries for the request."""
+    close_failed_connections()
+    counter = current_query_counter.get()
+    if counter is None:
+        return function()
+    with count_queries(counter):
+        return function()
+
+
+def run_concurrently(*functions):
+    """Call independent functions that query the database at once.
+
+    Under the ASGI handler the first function runs in the request thread
+    and the others in a pool of QUERY_WORKERS threads with persistent
+    connections of their own, in a copy of the request context. Their
+    queries count towards the request metrics. Elsewhere, e.g. under
+    WSGI or in tests, they run one by one. The functions must only
+    read, since they do not share the request's transaction.
+    """
+    if not run_queries_concurrently.get() or len(functions) < 2:
+        return [function() for function in functions]
+    first, *others = functions
+    futures = [
+        executor.submit(copy_context().run, run_in_pool, function)
+        for function in others
+    ]
+    return [first(), *(future.result() for future in futures)]
@@ -0,0 +1,34 @@
+from django.core.files.uploadedfile import UploadedFile
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+
+class ImageVariantField(serializers.ImageField):
+    """Read a recipe image as one of its resized variants.
+
+    The variant comes from the image_variant serializer context or the
+    field default. The original image is returned until the variant is
+    ready.
+    """
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        image = instance.image
+        variant = self.context.get('image_variant', self.variant)
+        name = instance.image_variants.get(variant)
+        if name:
+            image = image.field.attr_class(instance, image.field, name)
+        return super().to_representation(image)
+
+
+class Base64OrUploadImageField(Base64ImageField):
+    """Write an image from a base64 string or an uploaded file."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            return serializers.ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
@@ -1,7 +1,9 @@
+from django.db import models
 from django_filters import rest_framework as filters
 from django_filters.widgets import BooleanWidget
 
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
@@ -11,7 +13,12 @@ class RecipeFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='get_tags'
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='get_tags_mode'
     )
     is_favorited = filters.BooleanFilter(
         method='get_favorites',
@@ -21,6 +28,20 @@ class RecipeFilter(filters.FilterSet):
         method='get_carts',
         widget=BooleanWidget()
     )
+    search = filters.CharFilter(method='get_search')
+
+    def get_tags(self, queryset, field_name, value):
+        if not value:
+            return queryset
+        tags = Recipe.tags.through.objects.filter(recipe=models.OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') != 'all':
+            return queryset.filter(models.Exists(tags.filter(tag__in=value)))
+        for tag in value:
+            queryset = queryset.filter(models.Exists(tags.filter(tag=tag)))
+        return queryset
+
+    def get_tags_mode(self, queryset, field_name, value):
+        return queryset
 
     def get_favorites(self, queryset, field_name, value):
         if value and self.request.user.is_authenticated:
@@ -32,6 +53,9 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(cart__user=self.request.user)
         return queryset
 
+    def get_search(self, queryset, field_name, value):
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = ('author', 'tags')
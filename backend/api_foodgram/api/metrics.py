@@ -0,0 +1,178 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import connections
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+current_query_counter = ContextVar('current_query_counter', default=None)
+
+
+class Histogram:
+    """Histogram with fixed upper bounds in the Prometheus format."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name, labels):
+        lines, total = [], 0
+        bounds = [*map(str, self.buckets), '+Inf']
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {total}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {total}')
+        return lines
+
+
+class ViewStats:
+    """Request metrics of a single view."""
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = 0
+        self.errors = 0
+
+
+class RequestMetrics:
+    """Process-local registry of per-view request metrics.
+
+    Every gunicorn worker keeps its own registry, so /api/metrics/
+    reports the worker that served the scrape.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+
+    def record(self, view, latency, queries, sql_time, status_code):
+        with self.lock:
+            stats = self.views[view]
+            stats.latency.observe(latency)
+            stats.queries.observe(queries)
+            stats.sql_time += sql_time
+            if status_code >= 500:
+                stats.errors += 1
+
+    def render(self):
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = [
+                '# HELP foodgram_request_duration_seconds '
+                'Request latency by view.',
+                '# TYPE foodgram_request_duration_seconds histogram',
+            ]
+            for view, stats in views:
+                lines.extend(stats.latency.render(
+                    'foodgram_request_duration_seconds', f'view="{view}"'
+                ))
+            lines += [
+                '# HELP foodgram_request_queries SQL queries per request.',
+                '# TYPE foodgram_request_queries histogram',
+            ]
+            for view, stats in views:
+                lines.extend(stats.queries.render(
+                    'foodgram_request_queries', f'view="{view}"'
+                ))
+            lines += [
+                '# HELP foodgram_sql_duration_seconds_total '
+                'Time spent in SQL queries by view.',
+                '# TYPE foodgram_sql_duration_seconds_total counter',
+            ]
+            lines.extend(
+                f'foodgram_sql_duration_seconds_total{{view="{view}"}} '
+                f'{stats.sql_time}' for view, stats in views
+            )
+            lines += [
+                '# HELP foodgram_request_errors_total '
+                'Responses with a 5xx status by view.',
+                '# TYPE foodgram_request_errors_total counter',
+            ]
+            lines.extend(
+                f'foodgram_request_errors_total{{view="{view}"}} '
+                f'{stats.errors}' for view, stats in views
+            )
+        return lines
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries and their time.
+
+    Threads that run queries for the same request may share a counter.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.time += time.perf_counter() - start
+                self.count += 1
+
+
+@contextmanager
+def count_queries(counter):
+    """Run counter around every query of every configured database."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        yield counter
+
+
+def get_view_name(view_func, method):
+    """Return ViewSet.action for DRF views or a dotted name otherwise."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__qualname__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+def get_cache_counter_key(basename, hit):
+    return f'response-cache:{basename}:{"hits" if hit else "misses"}'
+
+
+def render_cache_counters(basenames):
+    """Render the shared response cache counters of viewsets."""
+    keys = {
+        (basename, hit): get_cache_counter_key(basename, hit)
+        for basename in basenames for hit in (True, False)
+    }
+    values = cache.get_many(keys.values())
+    lines = [
+        '# HELP foodgram_response_cache_total '
+        'Response cache lookups by viewset and result.',
+        '# TYPE foodgram_response_cache_total counter',
+    ]
+    for (basename, hit), key in keys.items():
+        result = 'hit' if hit else 'miss'
+        lines.append(
+            f'foodgram_response_cache_total'
+            f'{{viewset="{basename}",result="{result}"}} {values.get(key, 0)}'
+        )
+    return lines
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import (
+    QueryCounter, count_queries, current_query_counter, get_view_name,
+    request_metrics,
+)
+from .replicas import (
+    READ_METHODS, REPLICA, is_pinned, pin_to_primary, read_from_replica,
+)
+from recipes.tools import is_cache_shared
+
+
+class MetricsMiddleware:
+    """Record latency and SQL usage of every request by resolved view.
+
+    Streaming responses are measured until their content is consumed,
+    so queries made while streaming count towards the view as well.
+    The counter is also kept in a context variable for the pool threads
+    of api.concurrency.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.metrics_view = 'unresolved'
+        counter = QueryCounter()
+        start = time.perf_counter()
+        token = current_query_counter.set(counter)
+        try:
+            with count_queries(counter):
+                response = self.get_response(request)
+        finally:
+            current_query_counter.reset(token)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, counter, start
+            )
+        else:
+            self.record(request, response, counter, start)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(view_func, request.method)
+
+    def stream(self, request, response, content, counter, start):
+        try:
+            with count_queries(counter):
+                yield from content
+        finally:
+            self.record(request, response, counter, start)
+
+    def record(self, request, response, counter, start):
+        request_metrics.record(
+            request.metrics_view,
+            time.perf_counter() - start,
+            counter.count,
+            counter.time,
+            response.status_code
+        )
+
+
+class ReplicaMiddleware:
+    """Read from the replica for GET and HEAD requests of unpinned clients.
+
+    Any other request pins its client to the primary database for
+    REPLICA_PIN_SECONDS, so the client reads its own writes. Pins are
+    kept in the default cache, so with a process-local cache another
+    worker would not see them and every read stays on the primary.
+    """
+
+    def __init__(self, get_response):
+        if not is_cache_shared():
+            raise MiddlewareNotUsed(
+                'Replica pins need a cache shared by all workers.'
+            )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if REPLICA not in settings.DATABASES:
+            return self.get_response(request)
+        if request.method not in READ_METHODS:
+            try:
+                return self.get_response(request)
+            finally:
+                pin_to_primary(request)
+        with read_from_replica(not is_pinned(request)):
+            return self.get_response(request)
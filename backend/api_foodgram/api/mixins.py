@@ -0,0 +1,253 @@
+from hashlib import md5
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+from .metrics import get_cache_counter_key
+from recipes.tools import get_version
+
+
+def count_cache_access(basename, hit):
+    """Increment the shared hit or miss counter of a response cache."""
+    key = get_cache_counter_key(basename, hit)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+
+def get_rows(data):
+    """Return the serialized rows of a list, a page or a single object."""
+    if isinstance(data, list):
+        return data
+    return data.get('results', [data])
+
+
+def get_path(row, lookup):
+    """Return the value of a related__field lookup in a serialized row."""
+    for name in lookup.split('__'):
+        if not isinstance(row, dict):
+            return None
+        row = row.get(name)
+    return row
+
+
+def set_path(row, lookup, value):
+    """Replace the value of a lookup in a serialized row if it is there."""
+    *names, field = lookup.split('__')
+    for name in names:
+        row = row.get(name)
+        if not isinstance(row, dict):
+            return
+    if field in row:
+        row[field] = value
+
+
+def get_field_names(value):
+    """Return the set of names in a comma separated query parameter."""
+    if not value:
+        return set()
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class ConditionalGetMixin:
+    """Serve read actions with version validators and cached JSON bytes.
+
+    The ETag and Last-Modified headers come from the content version of
+    version_models, so a matching conditional request is answered with
+    304 before any serialization. Rendered bodies are cached by version
+    and normalized URL and go stale as soon as the version changes.
+
+    Stored counters in live_counters change too often to be part of the
+    version. Views with such counters cache the serialized data instead,
+    read the counters of its rows again with one query on every hit and
+    add their digest to the ETag.
+    """
+
+    version_models = ()
+    live_counters = ()
+    max_age = 60 * 60
+    cache_timeout = 60 * 60 * 24
+
+    def is_cacheable(self, request):
+        return request.accepted_renderer.format == 'json'
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        version = max(get_version(model) for model in self.version_models)
+        if self.live_counters:
+            response = self.get_live_response(
+                version, handler, request, *args, **kwargs
+            )
+        else:
+            etag = quote_etag(f'{self.basename}-{version}')
+            response = get_conditional_response(
+                request._request, etag=etag, last_modified=int(version)
+            )
+            if response is None:
+                response = self.get_content_response(
+                    etag, handler, request, *args, **kwargs
+                )
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(version)
+        patch_cache_control(response, public=True, max_age=self.max_age)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_cache_key(self, prefix, request):
+        query = urlencode(sorted(request.query_params.lists()), True)
+        url = request.build_absolute_uri(request.path)
+        key = md5(f'{prefix}:{url}?{query}'.encode()).hexdigest()
+        return f'response:{key}'
+
+    def get_cached(self, key, render, handler, request, *args, **kwargs):
+        """Return the cached value of key, caching the handler's if missing."""
+        value = cache.get(key)
+        hit = value is not None
+        count_cache_access(self.basename, hit)
+        if not hit:
+            value = render(handler(request, *args, **kwargs).data)
+            cache.set(key, value, self.cache_timeout)
+        return value, hit
+
+    def get_content_response(self, etag, handler, request, *args, **kwargs):
+        content, hit = self.get_cached(
+            self.get_cache_key(etag, request), JSONRenderer().render,
+            handler, request, *args, **kwargs
+        )
+        return self.make_response(content, hit)
+
+    def get_live_response(self, version, handler, request, *args, **kwargs):
+        data, hit = self.get_cached(
+            self.get_cache_key(f'{self.basename}-{version}', request),
+            lambda data: data, handler, request, *args, **kwargs
+        )
+        rows = get_rows(data)
+        if hit:
+            self.refresh_counters(rows)
+        digest = md5(repr([
+            get_path(row, lookup)
+            for row in rows for lookup in self.live_counters
+        ]).encode()).hexdigest()
+        etag = quote_etag(f'{self.basename}-{version}-{digest}')
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            response = self.make_response(JSONRenderer().render(data), hit)
+        response['ETag'] = etag
+        return response
+
+    def refresh_counters(self, rows):
+        """Set live_counters of serialized rows to their stored values."""
+        ids = [row['id'] for row in rows]
+        if not ids:
+            return
+        values = {
+            row.pop('pk'): row
+            for row in self.queryset.model.objects.filter(
+                pk__in=ids
+            ).values('pk', *self.live_counters)
+        }
+        for row in rows:
+            for lookup, value in values.get(row['id'], {}).items():
+                set_path(row, lookup, value)
+
+    def make_response(self, content, hit):
+        response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+
+class SparseFieldsMixin:
+    """Let read actions return only the fields asked for in the query.
+
+    The fields query parameter keeps only the listed fields and omit
+    drops the listed ones. Names are checked against the fields of
+    sparse_serializer_class and passed to serializers in the
+    sparse_fields context, so querysets can also skip the joins,
+    annotations and sparse_columns of the fields left out.
+    """
+
+    sparse_serializer_class = None
+    sparse_actions = ('list', 'retrieve')
+    sparse_columns = {}
+    fields_query_param = 'fields'
+    omit_query_param = 'omit'
+
+    def get_sparse_fields(self, serializer_class=None):
+        """Return the requested field names or None to keep all fields."""
+        if (
+            self.request.method not in ('GET', 'HEAD')
+            or self.action not in self.sparse_actions
+        ):
+            return None
+        params = self.request.query_params
+        fields = get_field_names(params.get(self.fields_query_param))
+        omit = get_field_names(params.get(self.omit_query_param))
+        if not fields and not omit:
+            return None
+        available = (
+            serializer_class or self.sparse_serializer_class
+        ).Meta.fields
+        unknown = (fields | omit) - set(available)
+        if unknown:
+            raise ValidationError(
+                {self.fields_query_param: f'Unknown fields {sorted(unknown)}'}
+            )
+        return tuple(
+            name for name in available
+            if (not fields or name in fields) and name not in omit
+        )
+
+    def get_sparse_columns(self, fields):
+        """Return the model columns to load for the given fields."""
+        return ['pk', *(
+            column for name in fields
+            for column in self.sparse_columns.get(name, ())
+        )]
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+
+class SparseFieldsSerializerMixin:
+    """Keep only the sparse_fields of the context in a root serializer.
+
+    Nested serializers share the root context but keep all of their
+    fields.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        names = self.context.get('sparse_fields')
+        if names is None or not self.is_root():
+            return fields
+        return {
+            name: field for name, field in fields.items() if name in names
+        }
+
+    def is_root(self):
+        parent = getattr(self, 'parent', None)
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        return parent is None
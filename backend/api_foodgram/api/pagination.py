@@ -0,0 +1,108 @@
+import json
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework import pagination
+
+from .concurrency import run_concurrently
+
+
+class ConcurrentPaginator(Paginator):
+    """Paginator that counts the rows while it reads the page.
+
+    The count and the page rows are independent queries, so under the
+    ASGI handler they run at the same time. Pages past the end are
+    still rejected once the count is known.
+    """
+
+    def page(self, number):
+        if (
+            'count' in self.__dict__ or not str(number).isdigit()
+            or int(number) < 1
+        ):
+            return super().page(number)
+        bottom = (int(number) - 1) * self.per_page
+        top = bottom + self.per_page + self.orphans
+        rows, _ = run_concurrently(
+            lambda: list(self.object_list[bottom:top]),
+            lambda: self.count
+        )
+        number = self.validate_number(number)
+        if bottom + self.per_page + self.orphans < self.count:
+            rows = rows[:self.per_page]
+        return self._get_page(rows, number, self)
+
+
+class ApproximatePaginator(ConcurrentPaginator):
+    """Paginator that takes the count from the PostgreSQL planner.
+
+    Small estimates are replaced by an exact count, since it is cheap
+    there and the planner is least accurate on small results.
+    """
+
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]['Plan']['Plan Rows'])
+        if estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """Page number pagination with an optional approximate count."""
+
+    django_paginator_class = ConcurrentPaginator
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.count_query_param) == 'approximate':
+            self.django_paginator_class = ApproximatePaginator
+        return super().paginate_queryset(queryset, request, view)
+
+
+class CursorPagination(pagination.CursorPagination):
+    """Keyset pagination over the ordering of the queryset."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return tuple(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+
+
+class FlexiblePagination(pagination.BasePagination):
+    """Page number pagination with an opt-in cursor mode.
+
+    Requests with ?pagination=cursor are paginated with opaque cursors
+    and never count the queryset. Other requests keep page numbers.
+    """
+
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.paginator = CursorPagination()
+        else:
+            self.paginator = PageNumberPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,43 @@
+import json
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class RecipeMultiPartParser(MultiPartParser):
+    """Parse recipe forms with every uploaded file spooled to disk.
+
+    Files are written to a temporary file chunk by chunk, so the memory
+    taken by an upload does not grow with the image size. Tags are sent
+    as repeated form fields and ingredients as JSON strings, either one
+    list or one object per field.
+    """
+
+    list_fields = ('tags',)
+    json_fields = ('ingredients',)
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']._request
+        request.upload_handlers = [TemporaryFileUploadHandler(request)]
+        result = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in result.data.lists():
+            if key in self.json_fields:
+                data[key] = self.parse_json(key, values)
+            elif key in self.list_fields:
+                data[key] = values
+            else:
+                data[key] = values[-1]
+        files = {key: result.files[key] for key in result.files}
+        return DataAndFiles(data, files)
+
+    def parse_json(self, key, values):
+        items = []
+        for value in values:
+            try:
+                value = json.loads(value)
+            except ValueError as exc:
+                raise ParseError(f'Field {key} is not valid JSON - {exc}')
+            items.extend(value if isinstance(value, list) else [value])
+        return items
@@ -0,0 +1,232 @@
+import zlib
+from functools import lru_cache
+from threading import Lock
+
+from reportlab.pdfbase.ttfonts import TTFontFile
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 50
+FONT_SIZE = 12
+LEADING = 16
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+TEXT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+SUBSET_SIZE = 256
+BFCHAR_SIZE = 100
+
+CATALOG, PAGES, RESOURCES = 1, 2, 3
+
+subset_lock = Lock()
+
+
+@lru_cache()
+def get_font(path):
+    """Return the parsed TrueType font, read once per process."""
+    return TTFontFile(path)
+
+
+def get_stream(dictionary, data):
+    """Return a compressed PDF stream object body."""
+    data = zlib.compress(data)
+    return (
+        b'<< %s /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream'
+        % (dictionary, len(data), data)
+    )
+
+
+def get_subset_name(font, subset):
+    tag = ''.join(chr(65 + subset // 26 ** n % 26) for n in range(6))
+    return f'{tag}+{font.name.decode()}'.encode()
+
+
+def get_to_unicode(subset):
+    """Return a CMap that maps the codes of a font subset to Unicode."""
+    entries = [
+        b'<%02X> <%s>' % (code, char.encode('utf-16-be').hex().encode())
+        for code, char in enumerate(subset)
+    ]
+    blocks = b''.join(
+        b'%d beginbfchar\n%s\nendbfchar\n' % (
+            len(entries[start:start + BFCHAR_SIZE]),
+            b'\n'.join(entries[start:start + BFCHAR_SIZE])
+        )
+        for start in range(0, len(entries), BFCHAR_SIZE)
+    )
+    return (
+        b'/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+        b'/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        b'/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+        b'/CMapType 2 def\n1 begincodespacerange\n<00> <FF>\n'
+        b'endcodespacerange\n%sendcmap\n'
+        b'CMapName currentdict /defineresource pop\nend\nend' % blocks
+    )
+
+
+class PDFWriter:
+    """Write lines of text as a PDF document, yielding it page by page.
+
+    Each page is sent as soon as it is full. The font is embedded at the
+    end of the file with only the characters in use, in subsets of up to
+    256 characters, so the memory used does not grow with the text.
+    """
+
+    def __init__(self, font_path):
+        self.font = get_font(font_path)
+        self.position = 0
+        self.offsets = {}
+        self.last_number = RESOURCES
+        self.pages = []
+        self.codes = {}
+        self.subsets = []
+
+    def allocate(self):
+        self.last_number += 1
+        return self.last_number
+
+    def add_object(self, number, body):
+        self.offsets[number] = self.position
+        data = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        self.position += len(data)
+        return data
+
+    def write(self, lines):
+        """Yield the document that shows the lines."""
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        self.position = len(header)
+        yield header
+        page = []
+        for text in lines:
+            for line in self.wrap(text):
+                page.append(line)
+                if len(page) == LINES_PER_PAGE:
+                    yield self.write_page(page)
+                    page = []
+        if page or not self.pages:
+            yield self.write_page(page)
+        yield self.write_end()
+
+    def get_width(self, text):
+        widths = self.font.charWidths
+        default = self.font.defaultWidth
+        return sum(
+            widths.get(ord(char), default) for char in text
+        ) * FONT_SIZE / 1000
+
+    def wrap(self, text):
+        """Split a line into lines that fit the page width."""
+        line = ''
+        for word in text.split(' '):
+            candidate = f'{line} {word}' if line else word
+            if line and self.get_width(candidate) > TEXT_WIDTH:
+                yield line
+                candidate = word
+            line = candidate
+        yield line
+
+    def encode(self, text):
+        """Return runs of (subset, codes) that show the text."""
+        runs = []
+        for char in text:
+            if char not in self.codes:
+                if not self.subsets or len(self.subsets[-1]) == SUBSET_SIZE:
+                    self.subsets.append([])
+                self.codes[char] = (
+                    len(self.subsets) - 1, len(self.subsets[-1])
+                )
+                self.subsets[-1].append(char)
+            subset, code = self.codes[char]
+            if runs and runs[-1][0] == subset:
+                runs[-1][1].append(code)
+            else:
+                runs.append((subset, [code]))
+        return runs
+
+    def write_page(self, lines):
+        content = [b'BT %d TL %d %d Td' % (
+            LEADING, MARGIN, PAGE_HEIGHT - MARGIN - FONT_SIZE
+        )]
+        for line in lines:
+            content.extend(
+                b'/F%d %d Tf <%s> Tj' % (
+                    subset, FONT_SIZE, bytes(codes).hex().encode()
+                )
+                for subset, codes in self.encode(line)
+            )
+            content.append(b'T*')
+        content.append(b'ET')
+        contents = self.allocate()
+        data = self.add_object(
+            contents, get_stream(b'', b'\n'.join(content))
+        )
+        page = self.allocate()
+        self.pages.append(page)
+        return data + self.add_object(page, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources %d 0 R /Contents %d 0 R >>' % (
+                PAGES, PAGE_WIDTH, PAGE_HEIGHT, RESOURCES, contents
+            )
+        ))
+
+    def write_font(self, number, subset):
+        """Return the objects of a font subset, the font dictionary last."""
+        font = self.font
+        with subset_lock:
+            font_file = font.makeSubset([ord(char) for char in subset])
+        name = get_subset_name(font, number)
+        font_file_number = self.allocate()
+        data = self.add_object(font_file_number, get_stream(
+            b'/Length1 %d' % len(font_file), font_file
+        ))
+        descriptor = self.allocate()
+        data += self.add_object(descriptor, (
+            b'<< /Type /FontDescriptor /FontName /%s /Flags 4 '
+            b'/FontBBox [%s] /ItalicAngle %d /Ascent %d /Descent %d '
+            b'/CapHeight %d /StemV %d /FontFile2 %d 0 R >>' % (
+                name, ' '.join(str(int(n)) for n in font.bbox).encode(),
+                font.italicAngle, font.ascent, font.descent,
+                font.capHeight, font.stemV, font_file_number
+            )
+        ))
+        to_unicode = self.allocate()
+        data += self.add_object(
+            to_unicode, get_stream(b'', get_to_unicode(subset))
+        )
+        widths = ' '.join(
+            str(round(font.charWidths.get(ord(char), font.defaultWidth)))
+            for char in subset
+        )
+        return data + self.add_object(self.allocate(), (
+            b'<< /Type /Font /Subtype /TrueType /BaseFont /%s '
+            b'/FirstChar 0 /LastChar %d /Widths [%s] '
+            b'/FontDescriptor %d 0 R /ToUnicode %d 0 R >>' % (
+                name, len(subset) - 1, widths.encode(), descriptor,
+                to_unicode
+            )
+        ))
+
+    def write_end(self):
+        fonts = []
+        data = b''
+        for number, subset in enumerate(self.subsets):
+            data += self.write_font(number, subset)
+            fonts.append(b'/F%d %d 0 R' % (number, self.last_number))
+        data += self.add_object(
+            RESOURCES, b'<< /Font << %s >> >>' % b' '.join(fonts)
+        )
+        data += self.add_object(PAGES, (
+            b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                b' '.join(b'%d 0 R' % page for page in self.pages),
+                len(self.pages)
+            )
+        ))
+        data += self.add_object(
+            CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES
+        )
+        size = self.last_number + 1
+        return data + b'xref\n0 %d\n0000000000 65535 f \n%s' % (
+            size, b''.join(
+                b'%010d 00000 n \n' % self.offsets[number]
+                for number in range(1, size)
+            )
+        ) + b'trailer\n<< /Size %d /Root %d 0 R >>\n' % (size, CATALOG) + (
+            b'startxref\n%d\n%%%%EOF\n' % self.position
+        )
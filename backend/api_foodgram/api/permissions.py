@@ -18,3 +18,12 @@ class IsAdminOrAuthorOrReadOnly(permissions.BasePermission):
             or request.user.is_admin
             or request.user == obj.author
         )
+
+
+class IsAdmin(permissions.BasePermission):
+    """Permission to only allow admins."""
+
+    message = 'Only admin can perform this.'
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_admin
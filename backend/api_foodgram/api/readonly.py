@@ -0,0 +1,248 @@
+from collections import defaultdict
+from operator import attrgetter
+
+from django.core.cache import cache
+
+from .serializers import RecipeSerializer
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.tools import get_instance_versions, get_version
+from users.serializers import CustomUserSerializer
+from users.tools import get_subscriptions
+
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+get_author_values = attrgetter(*AUTHOR_FIELDS)
+FRAGMENT_FIELDS = (
+    'tags', 'ingredients', 'author', 'name', 'text', 'cooking_time', 'image'
+)
+FLAG_RELATIONS = {'is_favorited': 'favorite', 'is_in_shopping_cart': 'cart'}
+ROW_FIELDS = (*FLAG_RELATIONS, *Recipe.COUNTER_FIELDS)
+IMAGE_FIELD = Recipe._meta.get_field('image')
+
+
+class ReadOnlySerializer:
+    """A read-only serializer for read actions built from plain dicts.
+
+    It takes the arguments of DRF serializers and returns the same data,
+    but reads rows with precompiled accessors instead of field objects.
+    Subclasses represent a whole list of instances at once, so related
+    rows can be loaded for all of them with a query each, and compute
+    only the fields left in the sparse_fields context.
+    """
+
+    fields = ()
+
+    def __init__(self, instance=None, many=False, context=None, **kwargs):
+        self.instance = instance
+        self.many = many
+        self.context = context or {}
+
+    @property
+    def data(self):
+        if self.many:
+            return self.to_representations(list(self.instance))
+        return self.to_representations([self.instance])[0]
+
+    def get_field_names(self):
+        fields = self.context.get('sparse_fields')
+        return self.fields if fields is None else fields
+
+    def to_representations(self, instances):
+        raise NotImplementedError
+
+
+class ReadOnlyUserSerializer(ReadOnlySerializer):
+    """A fast CustomUserSerializer for user lists."""
+
+    fields = CustomUserSerializer.Meta.fields
+
+    def to_representations(self, instances):
+        fields = self.get_field_names()
+        columns = [name for name in fields if name != 'is_subscribed']
+        subscriptions = frozenset()
+        if 'is_subscribed' in fields:
+            subscriptions = get_subscriptions(self.context.get('request'))
+        representations = []
+        for user in instances:
+            values = {name: getattr(user, name) for name in columns}
+            if 'is_subscribed' in fields:
+                values['is_subscribed'] = (
+                    user.is_subscribed if hasattr(user, 'is_subscribed')
+                    else user.id in subscriptions
+                )
+            representations.append({name: values[name] for name in fields})
+        return representations
+
+
+class ReadOnlyRecipeSerializer(ReadOnlySerializer):
+    """A fast RecipeSerializer for recipe lists and single recipes.
+
+    The parts of a recipe that are the same for every viewer are cached
+    as a fragment per recipe content version, image variant and set of
+    requested fields. Only counters and the per-user flags come from the
+    rows, which are annotated with them in the list or detail query.
+    Keys also hold the versions of tags and ingredients, so renaming them
+    rebuilds every fragment that embeds their names. Fragments of
+    missing recipes are built with one values query for each of tags,
+    ingredients and texts that were not loaded with the rows.
+    """
+
+    fields = RecipeSerializer.Meta.fields
+    default_image_variant = 'detail'
+    fragment_timeout = 60 * 60 * 24
+
+    def to_representations(self, instances):
+        request = self.context.get('request')
+        fields = self.get_field_names()
+        fragments = self.get_fragments(
+            instances,
+            tuple(name for name in FRAGMENT_FIELDS if name in fields),
+            self.context.get('image_variant', self.default_image_variant)
+        )
+        subscriptions = frozenset()
+        if (
+            'author' in fields and instances
+            and not hasattr(instances[0], 'author_is_subscribed')
+        ):
+            subscriptions = get_subscriptions(request)
+        representations = []
+        for recipe in instances:
+            values = {'id': recipe.id, **fragments[recipe.id]}
+            if 'author' in fields:
+                values['author'] = self.get_author(
+                    recipe, values['author'], subscriptions
+                )
+            if values.get('image') is not None and request is not None:
+                values['image'] = request.build_absolute_uri(values['image'])
+            for name in ROW_FIELDS:
+                if name in fields:
+                    values[name] = self.get_row_value(recipe, name, request)
+            representations.append({name: values[name] for name in fields})
+        return representations
+
+    def get_author(self, recipe, identity, subscriptions):
+        author = recipe.author
+        return {
+            **identity,
+            'is_subscribed': (
+                recipe.author_is_subscribed
+                if hasattr(recipe, 'author_is_subscribed')
+                else author.id in subscriptions
+            ),
+            'recipes_count': author.recipes_count,
+            'followers_count': author.followers_count,
+        }
+
+    def get_row_value(self, recipe, name, request):
+        if name in FLAG_RELATIONS:
+            return self.get_flag(recipe, name, FLAG_RELATIONS[name], request)
+        return getattr(recipe, name)
+
+    def get_fragments(self, instances, parts, variant):
+        """Return cached fragments of recipes and cache the missing ones."""
+        if not parts:
+            return {recipe.id: {} for recipe in instances}
+        versions = get_instance_versions(
+            Recipe, [recipe.id for recipe in instances]
+        )
+        names = ','.join(parts)
+        shared = f'{get_version(Tag)}:{get_version(Ingredient)}'
+        keys = {
+            id: f'recipe-fragment:{id}:{names}:{variant}:{version}:{shared}'
+            for id, version in versions.items()
+        }
+        found = cache.get_many(keys.values())
+        fragments = {id: found.get(key) for id, key in keys.items()}
+        missing = [
+            recipe for recipe in instances if fragments[recipe.id] is None
+        ]
+        if missing:
+            built = self.build_fragments(missing, parts, variant)
+            fragments.update(built)
+            cache.set_many(
+                {keys[id]: fragment for id, fragment in built.items()},
+                self.fragment_timeout
+            )
+        return fragments
+
+    def build_fragments(self, instances, parts, variant):
+        ids = [recipe.id for recipe in instances]
+        texts = tags = ingredients = {}
+        if 'text' in parts:
+            texts = self.get_texts(instances)
+        if 'tags' in parts:
+            tags = self.get_tags(ids)
+        if 'ingredients' in parts:
+            ingredients = self.get_ingredients(ids)
+        getters = {
+            'tags': lambda recipe: tags[recipe.id],
+            'ingredients': lambda recipe: ingredients[recipe.id],
+            'author': lambda recipe: dict(zip(
+                AUTHOR_FIELDS, get_author_values(recipe.author)
+            )),
+            'name': attrgetter('name'),
+            'text': lambda recipe: texts[recipe.id],
+            'cooking_time': attrgetter('cooking_time'),
+            'image': lambda recipe: self.get_image(recipe, variant),
+        }
+        return {
+            recipe.id: {part: getters[part](recipe) for part in parts}
+            for recipe in instances
+        }
+
+    def get_texts(self, instances):
+        texts = {
+            recipe.id: recipe.text for recipe in instances
+            if 'text' not in recipe.get_deferred_fields()
+        }
+        deferred = [
+            recipe.id for recipe in instances if recipe.id not in texts
+        ]
+        if deferred:
+            texts.update(Recipe.objects.filter(id__in=deferred).values_list(
+                'id', 'text'
+            ))
+        return texts
+
+    def get_tags(self, ids):
+        tags = defaultdict(list)
+        for recipe, id, name, color, slug in (
+            Recipe.tags.through.objects.filter(recipe__in=ids).values_list(
+                'recipe', 'tag', 'tag__name', 'tag__color', 'tag__slug'
+            ).order_by('tag__name')
+        ):
+            tags[recipe].append(
+                {'id': id, 'name': name, 'color': color, 'slug': slug}
+            )
+        return tags
+
+    def get_ingredients(self, ids):
+        ingredients = defaultdict(list)
+        for recipe, id, name, measurement_unit, amount in (
+            RecipeIngredient.objects.filter(recipe__in=ids).values_list(
+                'recipe', 'ingredient', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            ).order_by('id')
+        ):
+            ingredients[recipe].append({
+                'id': id,
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+        return ingredients
+
+    def get_flag(self, recipe, name, relation, request):
+        if hasattr(recipe, name):
+            return getattr(recipe, name)
+        return (
+            request
+            and request.user.is_authenticated
+            and getattr(recipe, relation).filter(user=request.user).exists()
+        ) or False
+
+    def get_image(self, recipe, variant):
+        """Return the relative URL of an image variant or the original."""
+        name = recipe.image_variants.get(variant) or recipe.image.name
+        if not name:
+            return None
+        return IMAGE_FIELD.storage.url(name)
@@ -0,0 +1,105 @@
+import csv
+import json
+from itertools import chain
+
+from django.conf import settings
+from rest_framework import renderers
+
+from .pdf import PDFWriter
+
+
+class Echo:
+    """A file-like object that returns the value written to it."""
+
+    def write(self, value):
+        return value
+
+
+def get_title(user):
+    return f'{user.get_full_name()} shopping list includes:'
+
+
+def get_line(ingredient):
+    return (
+        f'- {ingredient["ingredient__name"]} / {ingredient["amount"]} '
+        f'{ingredient["ingredient__measurement_unit"]}'
+    )
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Base renderer to stream a shopping list chunk by chunk."""
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(
+            data, ensure_ascii=False, separators=(',', ':')
+        ).encode('utf-8')
+
+    def stream(self, user, ingredients):
+        raise NotImplementedError('stream() must be implemented.')
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Stream a shopping list as plain text."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, user, ingredients):
+        yield get_title(user) + '\n'
+        separator = ''
+        for ingredient in ingredients:
+            yield separator + get_line(ingredient)
+            separator = '\n'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Stream a shopping list as CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, user, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'amount', 'measurement_unit'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['amount'],
+                ingredient['ingredient__measurement_unit']
+            ))
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    """Stream a shopping list as a JSON array."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, user, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'amount': ingredient['amount'],
+                'measurement_unit': ingredient['ingredient__measurement_unit']
+            }, ensure_ascii=False, separators=(',', ':'))
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    """Stream a shopping list as PDF, a page at a time."""
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+
+    def stream(self, user, ingredients):
+        return PDFWriter(settings.PDF_FONT_PATH).write(chain(
+            (get_title(user),), map(get_line, ingredients)
+        ))
@@ -0,0 +1,68 @@
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    """Send reads to the replica while a request allows it.
+
+    Writes, migrations and reads outside of such requests, e.g. in
+    management commands, always use the primary database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    token = use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        use_replica.reset(token)
+
+
+def get_pin_keys(request):
+    """Return cache keys that identify the client of a request.
+
+    A client is known by its address and by its Authorization header,
+    so a user who has just logged in is pinned under both.
+    """
+    meta = request.META
+    keys = [meta.get('HTTP_X_REAL_IP') or meta.get('REMOTE_ADDR', '')]
+    authorization = meta.get('HTTP_AUTHORIZATION')
+    if authorization:
+        keys.append(hashlib.sha256(authorization.encode()).hexdigest())
+    return [f'replica-pin:{key}' for key in keys]
+
+
+def is_pinned(request):
+    return bool(cache.get_many(get_pin_keys(request)))
+
+
+def pin_to_primary(request):
+    """Keep reads of the client on the primary until the replica catches up."""
+    cache.set_many(
+        dict.fromkeys(get_pin_keys(request), True),
+        settings.REPLICA_PIN_SECONDS
+    )
@@ -0,0 +1,76 @@
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from itertools import islice
+
+from recipes.models import Ingredient
+from recipes.tools import get_version
+
+Snapshot = namedtuple('Snapshot', ('version', 'rows', 'names', 'tokens'))
+
+
+def prefix_range(keys, prefix):
+    """Return positions of sorted (key, id) pairs starting with prefix."""
+    start = bisect_left(keys, (prefix,))
+    stop = bisect_left(keys, (prefix + '\U0010ffff',))
+    return range(start, stop)
+
+
+class IngredientIndex:
+    """Process-local autocomplete index over Ingredient names.
+
+    Names are case-folded and kept sorted, so prefix matches are found
+    with bisect. Every non-leading word of a name goes into a second
+    sorted list, which serves matches inside the name. The index is
+    rebuilt whenever the Ingredient content version changes, and with a
+    process-local cache at least every LOCAL_VERSION_TIMEOUT seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = Snapshot(None, {}, [], [])
+
+    def build(self, version):
+        rows, names, tokens = {}, [], []
+        for id, name, unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        ).order_by():
+            rows[id] = {'id': id, 'name': name, 'measurement_unit': unit}
+            key = name.casefold()
+            names.append((key, id))
+            tokens.extend((token, id) for token in key.split()[1:])
+        names.sort()
+        tokens.sort()
+        return Snapshot(version, rows, names, tokens)
+
+    def get_snapshot(self):
+        version = get_version(Ingredient)
+        if self.snapshot.version != version:
+            with self.lock:
+                if self.snapshot.version != version:
+                    self.snapshot = self.build(version)
+        return self.snapshot
+
+    def search(self, query='', limit=None):
+        """Return ingredients matching query, prefix hits first."""
+        snapshot = self.get_snapshot()
+        query = ' '.join(query.casefold().split())
+        prefix_ids = [
+            snapshot.names[position][1] for position in islice(
+                prefix_range(snapshot.names, query), limit
+            )
+        ]
+        if not query or limit and len(prefix_ids) >= limit:
+            return [snapshot.rows[id] for id in prefix_ids]
+        token_ids = {
+            snapshot.tokens[position][1]
+            for position in prefix_range(snapshot.tokens, query)
+        }.difference(prefix_ids)
+        token_ids = sorted(
+            token_ids, key=lambda id: snapshot.rows[id]['name'].casefold()
+        )
+        ids = islice(prefix_ids + token_ids, limit)
+        return [snapshot.rows[id] for id in ids]
+
+
+ingredient_index = IngredientIndex()
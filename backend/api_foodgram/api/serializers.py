@@ -1,13 +1,21 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import models, transaction
 from rest_framework import serializers
 
+from .fields import Base64OrUploadImageField, ImageVariantField
+from .mixins import SparseFieldsSerializerMixin
+from .tools import change_counter
+from recipes.images import (
+    schedule_image_variants, schedule_variants_deletion,
+)
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.tools import get_cart_users, update_cart_ingredients
 from users.serializers import CustomUserSerializer
 
 User = get_user_model()
 
+BULK_LIMIT = 100
+
 
 class TagSerializer(serializers.ModelSerializer):
     """A serializer to read Tag instances."""
@@ -42,7 +50,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
     """A serializer to add IngredientRecipe instances."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects)
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(min_value=1, write_only=True)
 
     class Meta:
@@ -50,7 +58,9 @@ class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """A serializer to read Recipe instances."""
 
     tags = TagSerializer(many=True, read_only=True)
@@ -58,18 +68,36 @@ class RecipeSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image = ImageVariantField(variant='detail')
 
     class Meta:
         model = Recipe
-        fields = '__all__'
+        fields = (
+            'id',
+            'tags',
+            'ingredients',
+            'author',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'name',
+            'text',
+            'cooking_time',
+            'image',
+            'favorites_count',
+            'cart_count'
+        )
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     def get_ingredients(self, obj):
-        return RecipeIngredientSerializer(
-            RecipeIngredient.objects.filter(recipe=obj),
-            many=True,
-        ).data
+        return RecipeIngredientSerializer(obj.amount.all(), many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request', False)
         return (
             request
@@ -78,6 +106,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request', False)
         return (
             request
@@ -94,7 +124,7 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     ingredients = AddIngredientToRecipeSerializer(many=True)
-    image = Base64ImageField(use_url=True, max_length=None)
+    image = Base64OrUploadImageField(use_url=True, max_length=None)
 
     class Meta:
         model = Recipe
@@ -107,45 +137,119 @@ class CreateUpdateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def validate_ingredients(self, value):
+        ids = [data['id'] for data in value]
+        if len(set(ids)) != len(ids):
+            raise serializers.ValidationError(
+                'Ingredients must not be repeated'
+            )
+        missing = set(ids).difference(Ingredient.objects.filter(
+            id__in=ids
+        ).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Ingredients {sorted(missing)} do not exist'
+            )
+        return value
+
     def to_representation(self, instance):
+        models.prefetch_related_objects(
+            [instance],
+            'tags',
+            models.Prefetch(
+                'amount',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
         request = self.context.get('request')
         context = {'request': request}
         return RecipeSerializer(instance, context=context).data
 
+    def set_ingredients(self, recipe, ingredients, rows=()):
+        """Write the difference between ingredients and existing rows.
+
+        Returns the change of amount per ingredient id.
+        """
+        rows = {row.ingredient_id: row for row in rows}
+        deltas, to_create, to_update = {}, [], []
+        for data in ingredients:
+            row = rows.pop(data['id'], None)
+            if row is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=data['id'],
+                    amount=data['amount']
+                ))
+                deltas[data['id']] = data['amount']
+            elif row.amount != data['amount']:
+                deltas[data['id']] = data['amount'] - row.amount
+                row.amount = data['amount']
+                to_update.append(row)
+        for ingredient, row in rows.items():
+            deltas[ingredient] = -row.amount
+        RecipeIngredient.objects.bulk_create(to_create)
+        RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if rows:
+            RecipeIngredient.objects.filter(
+                id__in=[row.id for row in rows.values()]
+            ).delete()
+        return deltas
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         validated_data['author'] = self.context['request'].user
         recipe = Recipe.objects.create(**validated_data)
+        change_counter(User, recipe.author_id, 'recipes_count', 1)
+        recipe.author.refresh_from_db(fields=('recipes_count',))
         recipe.tags.set(tags)
-
-        objs = [RecipeIngredient(
-            recipe=recipe,
-            ingredient=get_object_or_404(Ingredient, id=data['id'].id),
-            amount=data['amount']
-        ) for data in ingredients]
-
-        RecipeIngredient.objects.bulk_create(objs=objs)
+        self.set_ingredients(recipe, ingredients)
+        schedule_image_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        recipe = get_object_or_404(Recipe, id=instance.id)
-        recipe.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
-        for data in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=data['id'].id)
-            amount = data['amount']
-            RecipeIngredient.objects.create(
-                recipe=recipe, ingredient=ingredient, amount=amount
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            deltas = self.set_ingredients(
+                instance, ingredients, instance.amount.all()
             )
-        return super().update(instance, validated_data)
+            update_cart_ingredients(get_cart_users(instance), deltas)
+        if 'image' not in validated_data:
+            return super().update(instance, validated_data)
+        variants = Recipe.objects.select_for_update().values_list(
+            'image_variants', flat=True
+        ).get(pk=instance.pk)
+        recipe = super().update(instance, validated_data)
+        recipe.image_variants = {}
+        recipe.save(update_fields=['image_variants'])
+        schedule_variants_deletion(variants.values())
+        schedule_image_variants(recipe)
+        return recipe
 
 
 class FavoriteOrCartRecipeSerializer(serializers.ModelSerializer):
     """A serializer to read favorite or cart recipes."""
 
+    image = ImageVariantField(variant='thumbnail')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """A serializer to validate recipe ids of bulk favorite or cart changes."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_LIMIT
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .tools import change_counter
+from recipes.models import Cart, Favorite, Recipe
+from recipes.tools import bump_version, is_delete_handled
+from users.models import Follow
+
+User = get_user_model()
+
+TOKEN_USER_FIELDS = {
+    'password', 'is_active', 'is_staff', 'is_superuser', 'role',
+}
+DELETE_COUNTERS = {
+    Cart: (Recipe, 'recipe_id', 'cart_count'),
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    Follow: (User, 'author_id', 'followers_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+}
+
+
+@receiver(post_delete, sender=Token)
+def revoke_token(sender, **kwargs):
+    bump_version(Token)
+
+
+@receiver(post_save, sender=User)
+def revoke_user_tokens(sender, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is None or TOKEN_USER_FIELDS.intersection(update_fields):
+        bump_version(Token)
+
+
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Recipe)
+def decrement_counter(sender, instance, **kwargs):
+    """Decrement the stored counter that included a deleted row.
+
+    Counters of instances that are being deleted themselves and of bulk
+    deletions that change the counters in one step are left alone.
+    """
+    model, field, counter = DELETE_COUNTERS[sender]
+    pk = getattr(instance, field)
+    if not is_delete_handled(sender, (model, pk)):
+        change_counter(model, pk, counter, -1)
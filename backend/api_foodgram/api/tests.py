@@ -0,0 +1,446 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connections, models
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from .replicas import REPLICA
+from .serializers import RecipeSerializer
+from .views import RecipeViewSet
+from recipes.management.commands.checkserializers import CHECKS, Command
+from recipes.models import (
+    Cart, CartIngredient, Favorite, Ingredient, Recipe, RecipeIngredient, Tag,
+)
+from recipes.tools import (
+    get_live_cart_amounts, get_live_counters, get_recipe_amounts,
+    get_version, update_cart_ingredients,
+)
+from users.models import Follow, User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pw',
+        first_name='First', last_name='Last'
+    )
+
+
+def create_recipes(author, number):
+    """Create recipes with two tags and three ingredients each."""
+    tags = [
+        Tag.objects.get_or_create(
+            slug=f'tag-{n}', defaults={'name': f'tag {n}',
+                                       'color': f'#00000{n}'}
+        )[0]
+        for n in range(2)
+    ]
+    ingredients = [
+        Ingredient.objects.get_or_create(
+            name=f'ingredient {n}', measurement_unit='g'
+        )[0]
+        for n in range(3)
+    ]
+    recipes = []
+    for n in range(number):
+        recipe = Recipe.objects.create(
+            name=f'{author.username} recipe {n}', text='text',
+            cooking_time=n + 1, image='recipes/images/recipe.jpg',
+            author=author
+        )
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                             amount=n + 1)
+            for ingredient in ingredients
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+def set_live_counters():
+    """Store the counters computed from the linked rows."""
+    for model, counters in get_live_counters().items():
+        model.objects.update(**counters)
+
+
+@override_settings(DATABASE_ROUTERS=[])
+class RecipeQueriesTest(APITestCase):
+    """The recipe pages run a fixed number of queries per request.
+
+    Reads stay on the primary, so the counts hold with a replica too.
+    """
+
+    number_pages = (({'page': 1}, 6), ({'page': 2}, 2))
+    cursor_pages = (
+        ({'pagination': 'cursor', 'limit': 2}, 2),
+        ({'pagination': 'cursor', 'limit': 8}, 8),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.recipe = create_recipes(cls.user, 8)[-1]
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_list_queries(self, number, pages):
+        for params, size in pages:
+            with self.subTest(**params), self.assertNumQueries(number):
+                response = self.client.get('/api/recipes/', params)
+            self.assertEqual(len(response.json()['results']), size)
+
+    def assert_detail_queries(self, number):
+        with self.assertNumQueries(number):
+            response = self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.json()['id'], self.recipe.pk)
+
+    def test_anonymous_list(self):
+        self.assert_list_queries(5, self.number_pages)
+
+    def test_authenticated_list(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(5, self.number_pages)
+
+    def test_anonymous_cursor_list(self):
+        self.assert_list_queries(4, self.cursor_pages)
+
+    def test_authenticated_cursor_list(self):
+        self.client.force_authenticate(self.user)
+        self.assert_list_queries(4, self.cursor_pages)
+
+    def test_anonymous_detail(self):
+        self.assert_detail_queries(3)
+
+    def test_authenticated_detail(self):
+        self.client.force_authenticate(self.user)
+        self.assert_detail_queries(3)
+
+    def test_repeated_detail(self):
+        self.client.force_authenticate(self.user)
+        self.client.get(f'/api/recipes/{self.recipe.pk}/')
+        self.assert_detail_queries(1)
+
+    def test_cached_list_reads_counters(self):
+        response = self.client.get('/api/recipes/')
+        self.client.force_authenticate(create_user('reader'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/recipes/{self.recipe.pk}/favorite/')
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(1):
+            cached = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json()['results'][0]['favorites_count'], 1)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/recipes/', HTTP_IF_NONE_MATCH=cached['ETag']
+            )
+        self.assertEqual(response.status_code, 304)
+
+
+class ReplicaRoutingTest(APITestCase):
+    """Reads go to a second SQLite file unless the client has just written.
+
+    The replica is a copy of the migrated test database, so each side can
+    hold rows the other one does not have. Pins need a cache shared by
+    all workers, so a file based cache is used.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.shared_cache = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(cls.directory.name, 'cache'),
+        }})
+        cls.shared_cache.enable()
+        name = os.path.join(cls.directory.name, 'replica.sqlite3')
+        primary = connections['default']
+        primary.ensure_connection()
+        replica = sqlite3.connect(name)
+        primary.connection.backup(replica)
+        replica.close()
+        cls.saved_settings = connections.databases.get(REPLICA)
+        cls.drop_replica_connection()
+        connections.databases[REPLICA] = {
+            **primary.settings_dict, 'NAME': name
+        }
+        # The test runner must not set up the alias, so it is only added
+        # to the databases of the test case here.
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.drop_replica_connection()
+        if cls.saved_settings is None:
+            del connections.databases[REPLICA]
+        else:
+            connections.databases[REPLICA] = cls.saved_settings
+        cls.shared_cache.disable()
+        cls.directory.cleanup()
+
+    @classmethod
+    def drop_replica_connection(cls):
+        if REPLICA in connections.databases:
+            connections[REPLICA].close()
+            del connections[REPLICA]
+
+    @classmethod
+    def setUpTestData(cls):
+        create_user('user')
+        Tag.objects.create(name='primary', color='#000001', slug='primary')
+        Tag.objects.using(REPLICA).create(
+            name='replica', color='#000002', slug='replica'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def get_tag_names(self, **extra):
+        response = self.client.get('/api/tags/', **extra)
+        return [tag['name'] for tag in response.json()]
+
+    def test_reads_use_replica(self):
+        self.assertEqual(self.get_tag_names(), ['replica'])
+
+    def test_write_pins_client_to_primary(self):
+        response = self.client.post('/api/auth/token/login/', {
+            'email': 'user@example.com', 'password': 'pw'
+        })
+        token = response.json()['auth_token']
+        self.assertTrue(Token.objects.filter(key=token).exists())
+        self.assertFalse(Token.objects.using(REPLICA).exists())
+        self.assertEqual(
+            self.get_tag_names(HTTP_AUTHORIZATION=f'Token {token}'),
+            ['primary']
+        )
+        # Tag pages are cached for all clients.
+        cache.clear()
+        self.assertEqual(
+            self.get_tag_names(REMOTE_ADDR='10.0.0.2'), ['replica']
+        )
+
+    def test_local_cache_reads_primary(self):
+        with self.settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'replica-test',
+        }}):
+            self.assertEqual(self.get_tag_names(), ['primary'])
+
+
+class VersionTimeoutTest(APITestCase):
+    """Process-local versions expire, so other workers' writes show up."""
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(LOCAL_VERSION_TIMEOUT=0.05)
+    def test_local_version_expires(self):
+        version = get_version(Ingredient)
+        time.sleep(0.1)
+        self.assertGreater(get_version(Ingredient), version)
+
+    @override_settings(LOCAL_VERSION_TIMEOUT=0.05)
+    def test_shared_version_is_kept(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(CACHES={'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory,
+            }}):
+                version = get_version(Ingredient)
+                time.sleep(0.1)
+                self.assertEqual(get_version(Ingredient), version)
+
+
+class ReadOnlySerializersTest(APITestCase):
+    """Read-only list serializers render what the full serializers do."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = create_recipes(cls.author, 3)
+        create_recipes(cls.reader, 2)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Favorite.objects.create(user=cls.reader, recipe=cls.recipes[0])
+        Cart.objects.create(user=cls.reader, recipe=cls.recipes[1])
+
+    def test_serializers_match(self):
+        for user in (AnonymousUser(), self.author, self.reader):
+            for check in CHECKS:
+                with self.subTest(user=str(user), path=check[0]):
+                    self.assertEqual(Command().compare(user, *check, 200), 0)
+
+    def test_detail_matches(self):
+        for user in (AnonymousUser(), self.reader):
+            for recipe in self.recipes:
+                request = Request(APIRequestFactory().get(
+                    f'/api/recipes/{recipe.pk}/'
+                ))
+                request.user = user
+                view = RecipeViewSet(
+                    action='retrieve', request=request, format_kwarg=None,
+                    kwargs={'pk': recipe.pk}
+                )
+                instance = view.get_object()
+                full = RecipeSerializer(
+                    instance, context=view.get_serializer_context()
+                )
+                with self.subTest(user=str(user), recipe=recipe.pk):
+                    self.assertEqual(
+                        view.get_serializer(instance).data, full.data
+                    )
+
+
+class CartTotalsTest(APITestCase):
+    """Stored cart totals follow deletions of carts, recipes and users."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = create_recipes(cls.author, 3)
+        own = create_recipes(cls.reader, 1)
+        for recipe in (*cls.recipes, *own):
+            Cart.objects.create(user=cls.reader, recipe=recipe)
+            Cart.objects.create(user=cls.author, recipe=recipe)
+        update_cart_ingredients(
+            [cls.reader.id, cls.author.id],
+            get_recipe_amounts([*cls.recipes, *own])
+        )
+        set_live_counters()
+
+    def assert_totals(self):
+        stored = {
+            (row.user_id, row.ingredient_id): row.amount
+            for row in CartIngredient.objects.all()
+        }
+        self.assertEqual(stored, get_live_cart_amounts())
+
+    def test_delete_user(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.delete(
+            '/api/users/me/', {'current_password': 'pw'}
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_delete_recipe(self):
+        self.client.force_authenticate(self.author)
+        self.client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.recipes[1].delete()
+        self.assert_totals()
+
+    def test_remove_from_cart(self):
+        self.client.force_authenticate(self.reader)
+        self.client.delete(f'/api/recipes/{self.recipes[0].pk}/shopping_cart/')
+        self.client.delete(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [recipe.pk for recipe in self.recipes[1:]]},
+            format='json'
+        )
+        self.assertFalse(Cart.objects.filter(user=self.reader).exclude(
+            recipe__author=self.reader
+        ).exists())
+        self.assert_totals()
+
+
+class ShoppingListTest(APITestCase):
+    """The shopping list is streamed in every format."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        recipes = create_recipes(cls.user, 2)
+        for recipe in recipes:
+            Cart.objects.create(user=cls.user, recipe=recipe)
+        update_cart_ingredients([cls.user.id], get_recipe_amounts(recipes))
+
+    def download(self, format):
+        self.client.force_authenticate(self.user)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/', {'format': format}
+        )
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_text_formats(self):
+        self.assertIn('ingredient 0 / 3 g', self.download('txt').decode())
+        self.assertIn('ingredient 0,3,g', self.download('csv').decode())
+        self.assertEqual(len(json.loads(self.download('json'))), 3)
+
+    def test_pdf(self):
+        content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.endswith(b'%%EOF\n'))
+        self.assertIn(b'/FontFile2', content)
+
+
+class CountersTest(APITestCase):
+    """Stored counters follow deletions through the API and cascades."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.recipes = create_recipes(cls.author, 3)
+        own = create_recipes(cls.reader, 1)
+        for user, recipe in (
+            *((cls.reader, recipe) for recipe in cls.recipes),
+            (cls.author, own[0]),
+        ):
+            Favorite.objects.create(user=user, recipe=recipe)
+            Cart.objects.create(user=user, recipe=recipe)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.reader)
+        set_live_counters()
+
+    def assert_counters(self):
+        for model, counters in get_live_counters().items():
+            for counter, expression in counters.items():
+                with self.subTest(model=model.__name__, counter=counter):
+                    self.assertFalse(model.objects.annotate(
+                        live=expression
+                    ).exclude(**{counter: models.F('live')}).exists())
+
+    def test_delete_user(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.delete(
+            '/api/users/me/', {'current_password': 'pw'}
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters()
+
+    def test_delete_recipe(self):
+        self.client.force_authenticate(self.author)
+        self.client.delete(f'/api/recipes/{self.recipes[0].pk}/')
+        self.recipes[1].delete()
+        self.assert_counters()
+
+    def test_unlink(self):
+        self.client.force_authenticate(self.reader)
+        recipe = self.recipes[0]
+        self.client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.client.delete(f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.client.delete(f'/api/users/{self.author.pk}/subscribe/')
+        self.client.delete('/api/recipes/favorite/', {'recipes': [
+            recipe.pk for recipe in self.recipes[1:]
+        ]}, format='json')
+        self.client.delete('/api/recipes/shopping_cart/clear/')
+        for model in (Favorite, Cart, Follow):
+            self.assertFalse(model.objects.filter(user=self.reader).exists())
+        self.assert_counters()
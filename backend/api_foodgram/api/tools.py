@@ -1,10 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
+from recipes.tools import handle_deletes
 
+User = get_user_model()
+
+
+def change_counters(model, pks, counter, delta):
+    """Add delta to a stored counter of model instances in the database.
+
+    Counters are not part of the recipe content version, since cached
+    recipe pages read them again from their rows.
+    """
+    pks = list(pks)
+    if not pks:
+        return
+    model.objects.filter(pk__in=pks).update(
+        **{counter: models.F(counter) + delta}
+    )
+
+
+def change_counter(model, pk, counter, delta):
+    """Add delta to a stored counter of a model instance in the database."""
+    change_counters(model, [pk], counter, delta)
+
+
+@transaction.atomic
 def create_instance(
-        base_model, instance_model, instance_serializer, request, pk
+        base_model, instance_model, instance_serializer, request, pk, counter
 ):
     recipe = get_object_or_404(base_model, pk=pk)
     instance = instance_model.objects.filter(
@@ -16,12 +42,14 @@ def create_instance(
             recipe=recipe,
             user=request.user
         )
+        change_counter(base_model, recipe.pk, counter, 1)
         serializer = instance_serializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-def destroy_instance(base_model, instance_model, request, pk):
+@transaction.atomic
+def destroy_instance(base_model, instance_model, request, pk, counter):
     recipe = get_object_or_404(base_model, pk=pk)
     instance = instance_model.objects.filter(
         recipe=recipe,
@@ -34,3 +62,73 @@ def destroy_instance(base_model, instance_model, request, pk):
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_links(base_model, instance_model, user, ids):
+    """Map ids of existing recipes to whether the user has linked them.
+
+    The user row is locked first, so concurrent bulk changes of the same
+    user cannot count a link twice.
+    """
+    list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+    return dict(base_model.objects.filter(pk__in=ids).annotate(
+        linked=models.Exists(instance_model.objects.filter(
+            recipe=models.OuterRef('pk'), user=user
+        ))
+    ).values_list('pk', 'linked'))
+
+
+def get_results(ids, links, statuses):
+    """Return the status of every requested id in the request order."""
+    return [
+        {'id': pk, 'status': statuses.get(links.get(pk), 'not_found')}
+        for pk in ids
+    ]
+
+
+@transaction.atomic
+def create_instances(base_model, instance_model, user, ids, counter):
+    """Link many recipes to a user and return results with new ids."""
+    links = get_links(base_model, instance_model, user, ids)
+    created = [pk for pk, linked in links.items() if not linked]
+    instance_model.objects.bulk_create(
+        (instance_model(user=user, recipe_id=pk) for pk in created),
+        ignore_conflicts=True
+    )
+    change_counters(base_model, created, counter, 1)
+    results = get_results(ids, links, {False: 'created', True: 'exists'})
+    return results, created
+
+
+@transaction.atomic
+def destroy_instances(base_model, instance_model, user, ids, counter):
+    """Unlink many recipes from a user and return results with their ids."""
+    links = get_links(base_model, instance_model, user, ids)
+    deleted = [pk for pk, linked in links.items() if linked]
+    with handle_deletes(instance_model):
+        instance_model.objects.filter(user=user, recipe__in=deleted).delete()
+    change_counters(base_model, deleted, counter, -1)
+    results = get_results(ids, links, {True: 'deleted', False: 'missing'})
+    return results, deleted
+
+
+@transaction.atomic
+def clear_instances(base_model, instance_model, user, counter):
+    """Unlink all recipes from a user and return their ids."""
+    list(User.objects.select_for_update().filter(pk=user.pk).values('pk'))
+    deleted = list(instance_model.objects.filter(user=user).values_list(
+        'recipe', flat=True
+    ))
+    with handle_deletes(instance_model):
+        instance_model.objects.filter(user=user).delete()
+    change_counters(base_model, deleted, counter, -1)
+    return deleted
+
+
+def get_limit(request, param='limit'):
+    """Return a positive integer query parameter or None."""
+    try:
+        limit = int(request.query_params.get(param))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
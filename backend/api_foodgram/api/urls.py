@@ -1,7 +1,7 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from .views import IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet
 from users.views import CustomUserViewSet
 
 router = routers.DefaultRouter()
@@ -11,6 +11,7 @@ router.register('tags', TagViewSet)
 router.register('users', CustomUserViewSet)
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken'))
@@ -1,93 +1,308 @@
-from django.db import models
-from django.http import HttpResponse
-from rest_framework import filters, permissions, status, viewsets
+from itertools import chain
+
+from django.db import models, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .filters import RecipeFilter
-from .permissions import IsAdminOrAuthorOrReadOnly
+from .metrics import render_cache_counters, request_metrics
+from .mixins import ConditionalGetMixin, SparseFieldsMixin
+from .pagination import FlexiblePagination
+from .parsers import RecipeMultiPartParser
+from .permissions import IsAdmin, IsAdminOrAuthorOrReadOnly
+from .readonly import ReadOnlyRecipeSerializer
+from .renderers import (
+    CSVShoppingListRenderer, JSONShoppingListRenderer,
+    PDFShoppingListRenderer, TextShoppingListRenderer,
+)
 from .serializers import (
     CreateUpdateRecipeSerializer, FavoriteOrCartRecipeSerializer,
-    IngredientSerializer, RecipeSerializer, TagSerializer,
+    IngredientSerializer, RecipeIdsSerializer, RecipeSerializer,
+    TagSerializer,
+)
+from .search import ingredient_index
+from .tools import (
+    clear_instances, create_instance, create_instances, destroy_instance,
+    destroy_instances, get_limit,
 )
-from .tools import create_instance, destroy_instance
 from recipes.models import (
-    Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag,
+    Cart, CartIngredient, Favorite, Ingredient, Recipe, RecipeIngredient, Tag,
+)
+from recipes.tools import (
+    get_recipe_amounts, handle_deletes, update_cart_ingredients,
 )
+from users.models import Follow
+from users.serializers import CustomUserSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """A viewset for viewing Tag instances."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
+    version_models = (Tag,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """A viewset for viewing Ingredient instances."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    version_models = (Ingredient,)
 
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(self.search, request)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def search(self, request):
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''), get_limit(request)
+        ))
+
+
+class RecipeViewSet(
+    SparseFieldsMixin, ConditionalGetMixin, viewsets.ModelViewSet
+):
     """A viewset for viewing and editing Recipe instances."""
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
+    pagination_class = FlexiblePagination
+    parser_classes = (JSONParser, RecipeMultiPartParser)
     filterset_class = RecipeFilter
+    version_models = (Recipe, Ingredient, Tag)
+    live_counters = (
+        'favorites_count', 'cart_count',
+        'author__recipes_count', 'author__followers_count',
+    )
+    max_age = 0
+    sparse_serializer_class = RecipeSerializer
+    sparse_columns = {
+        'author': ('author', *(
+            f'author__{name}' for name in CustomUserSerializer.Meta.fields
+            if name != 'is_subscribed'
+        )),
+        'name': ('name',),
+        'text': ('text',),
+        'cooking_time': ('cooking_time',),
+        'image': ('image', 'image_variants'),
+        'favorites_count': ('favorites_count',),
+        'cart_count': ('cart_count',),
+    }
+
+    def is_cacheable(self, request):
+        return request.user.is_anonymous and super().is_cacheable(request)
+
+    def get_queryset(self):
+        if self.action not in ('list', 'retrieve'):
+            return self.queryset
+        queryset = self.queryset
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            queryset = queryset.only(*self.get_sparse_columns(fields))
+        else:
+            fields = self.sparse_serializer_class.Meta.fields
+            if self.is_read_only_list():
+                queryset = queryset.defer('text', 'search_vector')
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if not self.is_read_only():
+            queryset = self.prefetch_fields(queryset, fields)
+        return self.annotate_flags(queryset, fields)
+
+    def get_sparse_columns(self, fields):
+        columns = super().get_sparse_columns(fields)
+        if self.is_read_only_list():
+            # Texts of list pages come from the cached recipe fragments.
+            return [column for column in columns if column != 'text']
+        return columns
+
+    def prefetch_fields(self, queryset, fields):
+        lookups = []
+        if 'tags' in fields:
+            lookups.append('tags')
+        if 'ingredients' in fields:
+            lookups.append(models.Prefetch(
+                'amount',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ))
+        return queryset.prefetch_related(*lookups)
+
+    def annotate_flags(self, queryset, fields):
+        """Annotate the per-user flags among fields for the request user."""
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        flags = {}
+        if 'is_favorited' in fields:
+            flags['is_favorited'] = models.Exists(Favorite.objects.filter(
+                recipe=models.OuterRef('pk'), user=user
+            ))
+        if 'is_in_shopping_cart' in fields:
+            flags['is_in_shopping_cart'] = models.Exists(Cart.objects.filter(
+                recipe=models.OuterRef('pk'), user=user
+            ))
+        if 'author' in fields:
+            flags['author_is_subscribed'] = models.Exists(
+                Follow.objects.filter(
+                    author=models.OuterRef('author'), user=user
+                )
+            )
+        return queryset.annotate(**flags)
+
+    def is_read_only(self):
+        return (
+            self.action in ('list', 'retrieve')
+            and self.request.method == 'GET'
+        )
+
+    def is_read_only_list(self):
+        return self.action == 'list' and self.is_read_only()
 
     def get_serializer_class(self):
         if self.action in ('create', 'partial_update'):
             return CreateUpdateRecipeSerializer
+        if self.is_read_only():
+            return ReadOnlyRecipeSerializer
         return RecipeSerializer
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['image_variant'] = 'card'
+        return context
+
     @action(detail=True, methods=['post', 'delete'])
     def favorite(self, request, pk=None):
         if request.method == 'POST':
             return create_instance(
-                Recipe, Favorite, FavoriteOrCartRecipeSerializer, request, pk
+                Recipe, Favorite, FavoriteOrCartRecipeSerializer, request, pk,
+                'favorites_count'
             )
-        return destroy_instance(Recipe, Favorite, request, pk)
+        return destroy_instance(
+            Recipe, Favorite, request, pk, 'favorites_count'
+        )
 
     @action(detail=True, methods=['post', 'delete'])
+    @transaction.atomic
     def shopping_cart(self, request, pk=None):
-        if request.method == 'POST':
-            return create_instance(
-                Recipe, Cart, FavoriteOrCartRecipeSerializer, request, pk
+        if request.method == 'DELETE':
+            # Cart totals of deleted cart rows are updated by a receiver.
+            return destroy_instance(Recipe, Cart, request, pk, 'cart_count')
+        response = create_instance(
+            Recipe, Cart, FavoriteOrCartRecipeSerializer, request, pk,
+            'cart_count'
+        )
+        if status.is_success(response.status_code):
+            update_cart_ingredients(
+                [request.user.id], get_recipe_amounts([pk])
             )
-        return destroy_instance(Recipe, Cart, request, pk)
+        return response
+
+    def change_many(self, request, model, counter):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        change = (
+            create_instances if request.method == 'POST'
+            else destroy_instances
+        )
+        return change(
+            Recipe, model, request.user,
+            serializer.validated_data['recipes'], counter
+        )
 
     @action(
         detail=False,
-        methods=['get'],
+        methods=['post', 'delete'],
+        url_path='favorite',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def favorite_many(self, request):
+        results, _ = self.change_many(request, Favorite, 'favorites_count')
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    @transaction.atomic
+    def shopping_cart_many(self, request):
+        with handle_deletes(Cart):
+            results, recipes = self.change_many(request, Cart, 'cart_count')
+        if recipes:
+            update_cart_ingredients(
+                [request.user.id], get_recipe_amounts(recipes),
+                1 if request.method == 'POST' else -1
+            )
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=['delete'],
+        url_path='shopping_cart/clear',
         permission_classes=[permissions.IsAuthenticated]
     )
+    @transaction.atomic
+    def clear_shopping_cart(self, request):
+        with handle_deletes(Cart):
+            clear_instances(Recipe, Cart, request.user, 'cart_count')
+        CartIngredient.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[
+            TextShoppingListRenderer,
+            CSVShoppingListRenderer,
+            JSONShoppingListRenderer,
+            PDFShoppingListRenderer,
+        ]
+    )
     def download_shopping_cart(self, request):
-        if not request.user.cart.exists():
-            return Response(status=status.HTTP_400_BAD_REQUEST)
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__cart__user=request.user
+        ingredients = CartIngredient.objects.filter(
+            user=request.user
         ).values(
             'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=models.Sum('amount')).order_by('ingredient__name')
-        cart = (
-            f'{request.user.get_full_name()} shopping list includes:\n'
+            'ingredient__measurement_unit',
+            'amount'
+        ).order_by('ingredient__name').iterator()
+        first = next(ingredients, None)
+        if first is None:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(request.user, chain((first,), ingredients)),
+            content_type=content_type
         )
-        cart += '\n'.join([
-            f'- {ingredient["ingredient__name"]} / '
-            f'{ingredient["amount"]} '
-            f'{ingredient["ingredient__measurement_unit"]}'
-            for ingredient in ingredients
-        ])
-        filename = 'Shopping_list.txt'
-        response = HttpResponse(cart, content_type='text/plain')
+        filename = f'Shopping_list.{renderer.format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
+
+
+class MetricsView(APIView):
+    """A view to export request metrics in the Prometheus text format."""
+
+    permission_classes = (IsAdmin,)
+    cached_viewsets = ('tag', 'ingredient', 'recipe')
+
+    def get(self, request):
+        lines = request_metrics.render()
+        lines += render_cache_counters(self.cached_viewsets)
+        return HttpResponse(
+            '\n'.join(lines) + '\n',
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
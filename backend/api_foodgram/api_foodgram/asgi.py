@@ -8,9 +8,80 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
 import os
+from itertools import islice
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+from api.concurrency import concurrent_queries
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_foodgram.settings')
 
-application = get_asgi_application()
+STREAM_BATCH_SIZE = 64
+
+
+class ConcurrentASGIHandler(ASGIHandler):
+    """ASGI handler that serves sync views of requests concurrently.
+
+    Django 3.2 runs the sync views of all requests in one shared thread
+    and iterates streaming responses inside the event loop. Here every
+    request gets its own sync thread, as in later Django versions, and
+    streaming content is produced in that thread while the event loop
+    sends it to the client. Views may also run independent queries in
+    pool threads at once with api.concurrency.run_concurrently.
+    """
+
+    def __init__(self):
+        self.load_middleware()
+
+    async def get_response_async(self, request):
+        return await sync_to_async(
+            self.get_response, thread_sensitive=True
+        )(request)
+
+    async def __call__(self, scope, receive, send):
+        with concurrent_queries():
+            async with ThreadSensitiveContext():
+                await super().__call__(scope, receive, send)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        headers = [
+            (
+                header.encode('ascii') if isinstance(header, str) else header,
+                value.encode('latin1') if isinstance(value, str) else value,
+            ) for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        parts = iter(response)
+        read = sync_to_async(
+            lambda: list(islice(parts, STREAM_BATCH_SIZE)),
+            thread_sensitive=True
+        )
+        while True:
+            batch = await read()
+            if not batch:
+                break
+            for chunk, _ in self.chunk_bytes(b''.join(batch)):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+application = ConcurrentASGIHandler()
@@ -22,13 +22,11 @@ class RecipeAdmin(admin.ModelAdmin):
     """Custom Recipe admin panel."""
 
     inlines = (IngredientInline,)
-    list_display = ('name', 'author', 'favorites_count')
+    list_display = ('name', 'author', 'favorites_count', 'cart_count')
+    list_select_related = ('author',)
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-empty-'
 
-    def favorites_count(self, obj):
-        return obj.favorite.count()
-
 
 admin.site.register(Cart)
 admin.site.register(Favorite)
@@ -0,0 +1,105 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+from .tools import bump_instance_versions, bump_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (640, 640),
+    'detail': (1280, 1280),
+}
+FORMAT, EXTENSION = (
+    ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_WORKERS', 2),
+    thread_name_prefix='recipe-images'
+)
+
+
+def get_placeholder_image(name='images/placeholder.jpg'):
+    """Save a plain image for generated recipes and return its name."""
+    storage = Recipe._meta.get_field('image').storage
+    if storage.exists(name):
+        return name
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), 'orange').save(buffer, 'JPEG')
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def make_image_variants(recipe_id, name):
+    """Resize a recipe image into VARIANTS and store their file names.
+
+    The names are saved only if the recipe still has the same image,
+    so a slow job never overwrites the variants of a newer upload.
+    Otherwise the files just written are deleted again.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {}
+    try:
+        with storage.open(name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            for variant, size in VARIANTS.items():
+                resized = image.copy()
+                resized.thumbnail(size)
+                buffer = BytesIO()
+                resized.save(buffer, FORMAT, quality=80)
+                variants[variant] = storage.save(
+                    f'images/{variant}/{stem}.{EXTENSION}',
+                    ContentFile(buffer.getvalue())
+                )
+        if not Recipe.objects.filter(id=recipe_id, image=name).update(
+            image_variants=variants
+        ):
+            delete_image_variants(variants.values())
+            return
+        bump_version(Recipe)
+        bump_instance_versions(Recipe, [recipe_id])
+    except Exception:
+        logger.error(f'Cannot resize image {name}', exc_info=True)
+
+
+def delete_image_variants(names):
+    """Delete variant files, logging the ones that cannot be deleted."""
+    storage = Recipe._meta.get_field('image').storage
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            logger.warning(f'Cannot delete image variant {name}')
+
+
+def run_in_worker(recipe_id, name):
+    try:
+        make_image_variants(recipe_id, name)
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(recipe):
+    """Resize the recipe image in the worker pool after commit."""
+    recipe_id, name = recipe.id, recipe.image.name
+    transaction.on_commit(
+        lambda: executor.submit(run_in_worker, recipe_id, name)
+    )
+
+
+def schedule_variants_deletion(names):
+    """Delete variant files in the worker pool after commit."""
+    names = list(names)
+    if names:
+        transaction.on_commit(
+            lambda: executor.submit(delete_image_variants, names)
+        )
@@ -0,0 +1,298 @@
+import csv
+import json
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import models
+
+from .images import get_placeholder_image
+from .models import Ingredient, Recipe, RecipeIngredient, Tag
+from .search import update_search_index
+from .tools import bump_version
+
+User = get_user_model()
+
+JSON_SEPARATORS = ' \t\r\n,[]'
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Yield the objects of a JSON array or of JSON lines one by one.
+
+    The file is decoded chunk by chunk, so memory does not depend on
+    the file size.
+    """
+    decoder = json.JSONDecoder()
+    buffer, eof = '', False
+    while True:
+        buffer = buffer.lstrip(JSON_SEPARATORS)
+        try:
+            if not buffer:
+                raise ValueError('Buffer is empty')
+            obj, end = decoder.raw_decode(buffer)
+        except ValueError:
+            if eof:
+                if buffer:
+                    raise
+                return
+            chunk = file.read(chunk_size)
+            eof = not chunk
+            buffer += chunk
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+READERS = {'csv': read_csv, 'json': read_json}
+
+
+class Importer:
+    """Upsert rows of a model in batches keyed by a unique constraint.
+
+    Every batch costs one query to find existing rows, one bulk insert
+    and one bulk update. Rows whose key already exists are updated only
+    when one of update_fields differs.
+    """
+
+    model = None
+    key_fields = ()
+    update_fields = ()
+
+    def clean(self, row):
+        """Return model field values of a row or raise ValueError."""
+        fields = self.key_fields + self.update_fields
+        data = {
+            field: str(row.get(field) or '').strip() for field in fields
+        }
+        empty = [field for field, value in data.items() if not value]
+        if empty:
+            raise ValueError(f'Empty fields {empty}')
+        return data
+
+    def prepare(self, rows):
+        """Return cleaned rows of a batch with any values their keys need."""
+        return rows
+
+    def get_key(self, data):
+        return tuple(data[field] for field in self.key_fields)
+
+    def get_existing(self, keys):
+        first, *_ = self.key_fields
+        return {
+            self.get_key(vars(instance)): instance
+            for instance in self.model.objects.filter(**{
+                f'{first}__in': {key[0] for key in keys}
+            })
+        }
+
+    def import_batch(self, rows, dry_run=False):
+        """Upsert a batch of rows and return changes with their counts."""
+        cleaned = []
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ValueError(f'Row {row!r} is not an object')
+            cleaned.append(self.clean(row))
+        batch = {self.get_key(data): data for data in self.prepare(cleaned)}
+        existing = self.get_existing(batch)
+        to_create, to_update, changes = [], [], []
+        for key, data in batch.items():
+            instance = existing.get(key)
+            if instance is None:
+                to_create.append(data)
+                changes.append(f'+ {self.model.__name__} {key}')
+                continue
+            changed = {
+                field: value for field, value in data.items()
+                if field in self.update_fields
+                and getattr(instance, field) != value
+            }
+            if changed:
+                for field, value in changed.items():
+                    changes.append(
+                        f'~ {self.model.__name__} {key} {field}: '
+                        f'{getattr(instance, field)!r} -> {value!r}'
+                    )
+                    setattr(instance, field, value)
+                to_update.append(instance)
+        stats = Counter(
+            created=len(to_create),
+            updated=len(to_update),
+            unchanged=len(batch) - len(to_create) - len(to_update)
+        )
+        if not dry_run:
+            self.create(to_create)
+            if to_update:
+                self.model.objects.bulk_update(to_update, self.update_fields)
+        return changes, stats
+
+    def create(self, rows):
+        self.model.objects.bulk_create(
+            (self.model(**data) for data in rows), ignore_conflicts=True
+        )
+
+    def finish(self):
+        bump_version(self.model)
+
+
+class IngredientImporter(Importer):
+    """Ingredients are keyed by the unique_ingredient constraint."""
+
+    model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+
+
+class TagImporter(Importer):
+    """Tags are keyed by slug, their names and colors are updated."""
+
+    model = Tag
+    key_fields = ('slug',)
+    update_fields = ('name', 'color')
+
+
+class RecipeImporter(Importer):
+    """Demo recipes are keyed by name and author and are only inserted.
+
+    A row holds the author's email or username, a list of tag slugs and
+    a list of ingredients with name, measurement_unit and amount. Rows
+    without an image path share a placeholder image. Recipe names are
+    also unique on their own, so a name taken by another author is an
+    error rather than a new recipe.
+    """
+
+    model = Recipe
+    key_fields = ('name', 'author_id')
+
+    def clean(self, row):
+        try:
+            data = {
+                'name': str(row['name']).strip(),
+                'text': str(row['text']),
+                'cooking_time': int(row['cooking_time']),
+                'author': str(row['author']).strip(),
+                'image': row.get('image') or '',
+                'tags': list(row.get('tags') or []),
+                'ingredients': [
+                    (
+                        str(item['name']).strip(),
+                        str(item['measurement_unit']).strip(),
+                        int(item['amount'])
+                    ) for item in row['ingredients']
+                ],
+            }
+        except (KeyError, TypeError) as error:
+            raise ValueError(f'Missing or invalid field {error}')
+        keys = [item[:2] for item in data['ingredients']]
+        if len(keys) != len(set(keys)):
+            raise ValueError('Ingredients must not be repeated')
+        return data
+
+    def prepare(self, rows):
+        names = {row['author'] for row in rows}
+        authors = self.get_ids(User, ('email', 'username'), names)
+        unknown = names - authors.keys()
+        if unknown:
+            raise ValueError(f'Unknown authors {sorted(unknown)}')
+        for row in rows:
+            row['author_id'] = authors[row['author']]
+        return rows
+
+    def get_existing(self, keys):
+        existing = super().get_existing(keys)
+        authors = defaultdict(set)
+        for name, author in (*keys, *existing):
+            authors[name].add(author)
+        conflicts = sorted(
+            name for name, ids in authors.items() if len(ids) > 1
+        )
+        if conflicts:
+            raise ValueError(
+                f'Recipe names {conflicts} are used by several authors'
+            )
+        return existing
+
+    def create(self, rows):
+        if not rows:
+            return
+        ids = self.create_recipes(rows)
+        self.create_tags(rows, ids)
+        self.create_ingredients(rows, ids)
+        update_search_index(ids.values())
+
+    def create_recipes(self, rows):
+        """Insert recipes, update author counters and return recipe ids."""
+        image = None
+        if not all(row['image'] for row in rows):
+            image = get_placeholder_image()
+        Recipe.objects.bulk_create(
+            Recipe(
+                name=row['name'],
+                text=row['text'],
+                cooking_time=row['cooking_time'],
+                image=row['image'] or image,
+                author_id=row['author_id']
+            ) for row in rows
+        )
+        for author, count in Counter(
+            row['author_id'] for row in rows
+        ).items():
+            User.objects.filter(id=author).update(
+                recipes_count=models.F('recipes_count') + count
+            )
+        return {
+            (name, author): id for name, author, id in Recipe.objects.filter(
+                name__in=[row['name'] for row in rows]
+            ).values_list('name', 'author_id', 'id')
+        }
+
+    def create_tags(self, rows, ids):
+        tags = dict(Tag.objects.filter(
+            slug__in={slug for row in rows for slug in row['tags']}
+        ).values_list('slug', 'id'))
+        unknown = {slug for row in rows for slug in row['tags']} - tags.keys()
+        if unknown:
+            raise ValueError(f'Unknown tags {sorted(unknown)}')
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            through(
+                recipe_id=ids[row['name'], row['author_id']],
+                tag_id=tags[slug]
+            )
+            for row in rows for slug in row['tags']
+        )
+
+    def create_ingredients(self, rows, ids):
+        keys = {item[:2] for row in rows for item in row['ingredients']}
+        ingredients = {
+            (name, unit): id for id, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        unknown = keys - ingredients.keys()
+        if unknown:
+            raise ValueError(f'Unknown ingredients {sorted(unknown)}')
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=ids[row['name'], row['author_id']],
+                ingredient_id=ingredients[name, unit],
+                amount=amount
+            )
+            for row in rows for name, unit, amount in row['ingredients']
+        )
+
+    def get_ids(self, model, fields, values):
+        found = {}
+        for field in fields:
+            found.update(model.objects.filter(**{
+                f'{field}__in': values
+            }).values_list(field, 'id'))
+        return found
+
+
+IMPORTERS = {
+    'ingredients': IngredientImporter,
+    'tags': TagImporter,
+    'recipes': RecipeImporter,
+}
@@ -0,0 +1,199 @@
+'''Managment command to benchmark the main API endpoints'''
+
+import json
+import math
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment,
+)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.metrics import QueryCounter, count_queries
+from recipes.models import Cart, Ingredient, Recipe
+
+METRICS = (
+    ('p50_ms', 'p50', 'ms'),
+    ('p95_ms', 'p95', 'ms'),
+    ('rps', 'throughput', 'req/s'),
+    ('queries', 'queries', ''),
+    ('peak_kb', 'peak', 'KB'),
+)
+
+
+def percentile(values, rank):
+    """Return the nearest-rank percentile of values."""
+    values = sorted(values)
+    return values[max(math.ceil(rank / 100 * len(values)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = 'Use this command to benchmark the main API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=20,
+            help='Timed requests per endpoint'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Untimed requests per endpoint'
+        )
+        parser.add_argument(
+            '--url',
+            help='Send HTTP requests to a running server, '
+                 'e.g. http://127.0.0.1:8000, instead of the test client'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Parallel HTTP requests per endpoint with --url'
+        )
+        parser.add_argument(
+            '--output', help='Write the JSON report to this file'
+        )
+        parser.add_argument(
+            '--compare', help='Print changes against an earlier JSON report'
+        )
+
+    def handle(self, *args, **options):
+        cart = Cart.objects.select_related('user').order_by('id').first()
+        recipe = Recipe.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if cart is None or recipe is None or ingredient is None:
+            raise CommandError('Run generatedata before benchmarking')
+        token, _ = Token.objects.get_or_create(user=cart.user)
+        word = recipe.name.split()[0]
+        endpoints = {
+            'recipes.list.anonymous': (None, '/api/recipes/'),
+            'recipes.list': (token, '/api/recipes/'),
+            'recipes.list.cursor': (
+                token, '/api/recipes/?pagination=cursor'
+            ),
+            'recipes.list.favorited': (
+                token, '/api/recipes/?is_favorited=1'
+            ),
+            'recipes.search': (token, f'/api/recipes/?search={word}'),
+            'recipes.retrieve': (token, f'/api/recipes/{recipe.id}/'),
+            'recipes.download_shopping_cart': (
+                token, '/api/recipes/download_shopping_cart/'
+            ),
+            'ingredients.search': (
+                token, f'/api/ingredients/?name={ingredient.name[:2]}'
+            ),
+            'tags.list': (token, '/api/tags/'),
+            'users.list': (token, '/api/users/'),
+            'users.subscriptions': (
+                token, '/api/users/subscriptions/?recipes_limit=3'
+            ),
+        }
+        measure = self.measure_http if options['url'] else self.measure
+        setup_test_environment()
+        try:
+            report = {
+                'database': connection.vendor,
+                'requests': options['requests'],
+                'server': options['url'] or 'test client',
+                'concurrency': options['concurrency'],
+                'endpoints': {
+                    name: measure(*endpoint, options)
+                    for name, endpoint in endpoints.items()
+                },
+            }
+        finally:
+            teardown_test_environment()
+        content = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(content + '\n')
+        else:
+            self.stdout.write(content)
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def measure(self, token, url, options):
+        client = APIClient()
+        if token is not None:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for _ in range(options['warmup']):
+            self.request(client, url)
+        timings = []
+        for _ in range(options['requests']):
+            start = time.perf_counter()
+            self.request(client, url)
+            timings.append((time.perf_counter() - start) * 1000)
+        with count_queries(QueryCounter()) as queries:
+            status_code = self.request(client, url)
+        tracemalloc.start()
+        try:
+            self.request(client, url)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'status': status_code,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': queries.count,
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def request(self, client, url):
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    def measure_http(self, token, url, options):
+        headers = {}
+        if token is not None:
+            headers['Authorization'] = f'Token {token.key}'
+        request = Request(options['url'].rstrip('/') + url, headers=headers)
+        for _ in range(options['warmup']):
+            self.fetch(request)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            results = list(executor.map(
+                self.fetch, [request] * options['requests']
+            ))
+        elapsed = time.perf_counter() - start
+        timings = [timing for _, timing in results]
+        statuses = Counter(status_code for status_code, _ in results)
+        return {
+            'status': statuses.most_common(1)[0][0],
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'rps': round(len(results) / elapsed, 1),
+        }
+
+    def fetch(self, request):
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status_code = response.status
+        except HTTPError as error:
+            status_code = error.code
+        return status_code, (time.perf_counter() - start) * 1000
+
+    def compare(self, report, path):
+        with open(path) as file:
+            baseline = json.load(file)['endpoints']
+        for name, current in report['endpoints'].items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            changes = ', '.join(
+                f'{label} {previous[key]} -> {current[key]} {unit}'.rstrip()
+                for key, label, unit in METRICS
+                if key in previous and key in current
+            )
+            self.stdout.write(f'{name}: {changes}')
@@ -0,0 +1,93 @@
+'''Managment command to compare read-only list serializers with full ones'''
+
+import logging
+import sys
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.readonly import ReadOnlyRecipeSerializer, ReadOnlyUserSerializer
+from api.serializers import RecipeSerializer
+from api.views import RecipeViewSet
+from users.serializers import CustomUserSerializer
+from users.views import CustomUserViewSet
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+User = get_user_model()
+
+CHECKS = (
+    ('/api/recipes/', RecipeViewSet, RecipeSerializer,
+     ReadOnlyRecipeSerializer),
+    ('/api/users/', CustomUserViewSet, CustomUserSerializer,
+     ReadOnlyUserSerializer),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Use this command to check that read-only list serializers '
+        'render the same JSON as the full serializers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=200,
+            help='Rows to compare for every list and user'
+        )
+
+    def handle(self, *args, **options):
+        users = [AnonymousUser()]
+        user = User.objects.filter(
+            cart__isnull=False, favorite__isnull=False
+        ).first() or User.objects.first()
+        if user is not None:
+            users.append(user)
+        mismatches = 0
+        setup_test_environment()
+        try:
+            for user in users:
+                for check in CHECKS:
+                    mismatches += self.compare(
+                        user, *check, options['limit']
+                    )
+        finally:
+            teardown_test_environment()
+        if mismatches:
+            raise CommandError(f'{mismatches} rows are rendered differently')
+        logger.debug('Read-only serializers match the full serializers\n')
+
+    def compare(self, user, path, viewset, full, fast, limit):
+        request = Request(APIRequestFactory().get(path))
+        request.user = user
+        view = viewset(
+            action='list', request=request, format_kwarg=None, kwargs={}
+        )
+        instances = list(view.get_queryset()[:limit])
+        context = view.get_serializer_context()
+        expected = full(instances, many=True, context=context).data
+        actual = fast(instances, many=True, context=context).data
+        mismatches = [
+            first['id'] for first, second in zip(expected, actual)
+            if JSONRenderer().render(first) != JSONRenderer().render(second)
+        ]
+        if len(expected) != len(actual) or mismatches:
+            logger.error(
+                f'{path} as {user} differs for {len(mismatches)} of '
+                f'{len(expected)} rows: {mismatches[:20]}'
+            )
+        return len(mismatches) + abs(len(expected) - len(actual))
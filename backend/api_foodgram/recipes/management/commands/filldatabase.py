@@ -1,13 +1,16 @@
 '''Managment command to fill the database'''
 
+import csv
 import logging
 import sys
-from csv import DictReader
+import time
+from collections import Counter
+from itertools import islice
 
-from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
 
-from recipes.models import Ingredient
+from recipes.importers import IMPORTERS, READERS
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -18,26 +21,99 @@ formatter = logging.Formatter(
 logger.addHandler(handler)
 handler.setFormatter(formatter)
 
-User = get_user_model()
+
+def format_stats(stats):
+    return ', '.join(
+        f'{stats[key]} {key}' for key in ('created', 'updated', 'unchanged')
+    )
 
 
 class Command(BaseCommand):
     help = 'Use this command to fill the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='static/data/ingredients.csv',
+            help='CSV file, JSON array or JSON lines file to load'
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='File format, taken from the file extension by default'
+        )
+        parser.add_argument(
+            '--model',
+            choices=IMPORTERS,
+            default='ingredients',
+            help='What the file holds'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Rows per transaction'
+        )
+        parser.add_argument(
+            '--start',
+            type=int,
+            default=0,
+            help='Skip this many rows, e.g. to resume an interrupted load'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print rows that would be created or updated and exit'
+        )
+
     def handle(self, *args, **options):
-        logger.debug(f'Start {Ingredient.__name__} data transfer')
+        path, model = options['path'], options['model']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Unknown format of {path}, use --format')
+        importer = IMPORTERS[model]()
+        logger.debug(f'Start {model} data transfer from {path}')
         try:
-            objs = [
-                Ingredient(**obj) for obj in DictReader(
-                    open('static/data/ingredients.csv', encoding='utf8')
+            with open(path, encoding='utf8') as file:
+                self.load(importer, READERS[file_format](file), options)
+        except OSError as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+        except (ValueError, csv.Error) as error:
+            raise CommandError(f'Cannot parse {path}: {error}')
+
+    def load(self, importer, rows, options):
+        dry_run, number = options['dry_run'], options['start']
+        rows = islice(rows, number, None)
+        totals, started = Counter(), time.monotonic()
+        try:
+            self.load_batches(importer, rows, number, totals, options)
+        finally:
+            if not dry_run and totals:
+                importer.finish()
+        rate = sum(totals.values()) / ((time.monotonic() - started) or 1)
+        logger.debug(
+            f'Data successfully {"checked" if dry_run else "loaded"} '
+            f'at {rate:.0f} rows/s: {format_stats(totals)}\n'
+        )
+
+    def load_batches(self, importer, rows, number, totals, options):
+        batch_size, dry_run = options['batch_size'], options['dry_run']
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            try:
+                with transaction.atomic():
+                    changes, stats = importer.import_batch(batch, dry_run)
+            except (ValueError, DatabaseError) as error:
+                raise CommandError(
+                    f'Rows {number + 1}-{number + len(batch)} were not '
+                    f'loaded: {error}. Fix the data and resume with '
+                    f'--start {number}'
                 )
-            ]
-            Ingredient.objects.bulk_create(objs=objs, ignore_conflicts=True)
-            logger.debug(
-                f'Data successfully loaded into {Ingredient.__name__}\n'
-            )
-        except Exception:
-            logger.error(
-                'We have a problem with data or model\n',
-                exc_info=True
-            )
+            number += len(batch)
+            totals.update(stats)
+            if dry_run and changes:
+                self.stdout.write('\n'.join(changes))
+            logger.debug(f'{number} rows processed: {format_stats(totals)}')
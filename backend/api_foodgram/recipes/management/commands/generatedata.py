@@ -0,0 +1,192 @@
+'''Managment command to generate synthetic data for local load tests'''
+
+import logging
+import random
+import sys
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from recipes.images import get_placeholder_image
+from recipes.models import (
+    Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag,
+)
+from recipes.search import update_search_index
+from recipes.tools import bump_version
+from users.models import Follow
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+WORDS = (
+    'apple', 'basil', 'butter', 'cheese', 'chicken', 'garlic', 'honey',
+    'lemon', 'mushroom', 'onion', 'pasta', 'pepper', 'potato', 'rice',
+    'salmon', 'spinach', 'tomato', 'vanilla',
+)
+
+
+def get_last_id(model):
+    return model.objects.aggregate(last=models.Max('id'))['last'] or 0
+
+
+def create_rows(model, rows):
+    """Bulk insert rows and return ids of the new rows in insert order.
+
+    Django 3.2 returns no ids from bulk inserts on SQLite, so the ids are
+    read back as everything above the previous maximum.
+    """
+    last_id = get_last_id(model)
+    model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return list(model.objects.filter(id__gt=last_id).order_by(
+        'id'
+    ).values_list('id', flat=True))
+
+
+class Command(BaseCommand):
+    help = 'Use this command to generate synthetic data for load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--ingredients', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument(
+            '--recipe-ingredients', type=int, default=8,
+            help='Ingredients per recipe'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20, help='Favorites per user'
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5, help='Cart recipes per user'
+        )
+        parser.add_argument(
+            '--follows', type=int, default=10, help='Follows per user'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        logger.debug('Start synthetic data generation')
+        users = self.create_users(options['users'])
+        tags = self.create_tags(options['tags'])
+        ingredients = self.get_ingredients(options['ingredients'])
+        recipes = self.create_recipes(
+            options['recipes'], users, tags, ingredients,
+            options['recipe_ingredients']
+        )
+        self.create_links(Favorite, users, recipes, options['favorites'])
+        self.create_links(Cart, users, recipes, options['carts'])
+        self.create_follows(users, options['follows'])
+        call_command('rebuildcart')
+        call_command('reconcilecounters')
+        update_search_index()
+        for model in (Ingredient, Recipe, Tag):
+            bump_version(model)
+        logger.debug('Synthetic data successfully generated\n')
+
+    def create_users(self, count):
+        start = get_last_id(User) + 1
+        password = make_password('synthetic')
+        return create_rows(User, [
+            User(
+                username=f'synthetic{number}',
+                email=f'synthetic{number}@example.com',
+                first_name='Synthetic',
+                last_name=f'User {number}',
+                password=password
+            ) for number in range(start, start + count)
+        ])
+
+    def create_tags(self, count):
+        start = get_last_id(Tag) + 1
+        used = set(Tag.objects.values_list('color', flat=True))
+        colors = (
+            color for color in (
+                f'#{number:06x}' for number in range(0x100000, 0x1000000)
+            ) if color not in used
+        )
+        return create_rows(Tag, [
+            Tag(
+                name=f'Synthetic tag {number}',
+                color=next(colors),
+                slug=f'synthetic-{number}'
+            ) for number in range(start, start + count)
+        ]) or list(Tag.objects.values_list('id', flat=True))
+
+    def get_ingredients(self, count):
+        existing = list(Ingredient.objects.values_list('id', flat=True))
+        if len(existing) >= count:
+            return existing
+        start = get_last_id(Ingredient) + 1
+        return existing + create_rows(Ingredient, [
+            Ingredient(
+                name=f'{self.random.choice(WORDS)} {number}',
+                measurement_unit=self.random.choice(('g', 'ml', 'pcs'))
+            ) for number in range(start, start + count - len(existing))
+        ])
+
+    def create_recipes(self, count, users, tags, ingredients, size):
+        name = get_placeholder_image()
+        start = get_last_id(Recipe) + 1
+        recipes = create_rows(Recipe, [
+            Recipe(
+                name=f'Synthetic recipe {number}',
+                text=' '.join(self.random.choices(WORDS, k=40)),
+                cooking_time=self.random.randint(5, 180),
+                image=name,
+                author_id=self.random.choice(users)
+            ) for number in range(start, start + count)
+        ])
+        through = Recipe.tags.through
+        through.objects.bulk_create((
+            through(recipe_id=recipe, tag_id=tag)
+            for recipe in recipes
+            for tag in self.random.sample(tags, min(len(tags), 2))
+        ), batch_size=BATCH_SIZE)
+        RecipeIngredient.objects.bulk_create((
+            RecipeIngredient(
+                recipe_id=recipe,
+                ingredient_id=ingredient,
+                amount=self.random.randint(1, 500)
+            )
+            for recipe in recipes
+            for ingredient in self.random.sample(
+                ingredients, min(len(ingredients), size)
+            )
+        ), batch_size=BATCH_SIZE)
+        logger.debug(f'{len(recipes)} recipes generated')
+        return recipes
+
+    def create_links(self, model, users, recipes, size):
+        model.objects.bulk_create((
+            model(user_id=user, recipe_id=recipe)
+            for user in users
+            for recipe in self.random.sample(
+                recipes, min(len(recipes), size)
+            )
+        ), batch_size=BATCH_SIZE)
+
+    def create_follows(self, users, size):
+        size = min(len(users) - 1, size)
+        Follow.objects.bulk_create((
+            Follow(user_id=user, author_id=author)
+            for user in users
+            for author in [
+                author for author in self.random.sample(users, size + 1)
+                if author != user
+            ][:size]
+        ), batch_size=BATCH_SIZE)
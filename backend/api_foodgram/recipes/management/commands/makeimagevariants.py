@@ -0,0 +1,38 @@
+'''Managment command to resize images of existing recipes'''
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import make_image_variants
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Use this command to resize images of existing recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Resize images that already have variants too'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        logger.debug(f'Start resizing images of {recipes.count()} recipes')
+        for recipe_id, name in recipes.values_list('id', 'image').iterator():
+            make_image_variants(recipe_id, name)
+        logger.debug('Images successfully resized\n')
@@ -0,0 +1,67 @@
+'''Managment command to rebuild and verify shopping cart totals'''
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import CartIngredient
+from recipes.tools import get_live_cart_amounts
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Use this command to rebuild and verify shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare stored totals with the live aggregate'
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            self.rebuild()
+        stored = {
+            (user, ingredient): amount
+            for user, ingredient, amount in CartIngredient.objects.values_list(
+                'user', 'ingredient', 'amount'
+            )
+        }
+        live = get_live_cart_amounts()
+        mismatches = [
+            key for key in stored.keys() | live.keys()
+            if stored.get(key) != live.get(key)
+        ]
+        for user, ingredient in mismatches[:20]:
+            logger.error(
+                f'User {user}, ingredient {ingredient}: stored '
+                f'{stored.get((user, ingredient))}, '
+                f'live {live.get((user, ingredient))}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} of {len(live)} cart totals differ'
+            )
+        logger.debug(f'All {len(live)} cart totals match\n')
+
+    @transaction.atomic
+    def rebuild(self):
+        logger.debug(f'Start {CartIngredient.__name__} rebuild')
+        CartIngredient.objects.all().delete()
+        CartIngredient.objects.bulk_create(
+            CartIngredient(
+                user_id=user, ingredient_id=ingredient, amount=total
+            )
+            for (user, ingredient), total in get_live_cart_amounts().items()
+        )
@@ -0,0 +1,28 @@
+'''Managment command to rebuild the recipe full-text search index'''
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from recipes.search import create_search_index, update_search_index
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Use this command to rebuild the recipe full-text search index'
+
+    def handle(self, *args, **options):
+        logger.debug('Start rebuilding the recipe search index')
+        create_search_index(connection)
+        update_search_index()
+        logger.debug('Search index successfully rebuilt\n')
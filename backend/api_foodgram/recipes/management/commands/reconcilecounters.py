@@ -0,0 +1,53 @@
+'''Managment command to reconcile stored recipe and user counters'''
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+
+from recipes.tools import get_live_counters
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = 'Use this command to reconcile stored recipe and user counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report counters that differ from live counts'
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        stale_total = 0
+        for model, counters in get_live_counters().items():
+            for counter, expression in counters.items():
+                stale = model.objects.annotate(live=expression).exclude(
+                    **{counter: models.F('live')}
+                ).values_list('pk', flat=True)
+                stale_ids = list(stale)
+                if not stale_ids:
+                    continue
+                logger.error(
+                    f'{model.__name__}.{counter} differs for '
+                    f'{len(stale_ids)} rows: {stale_ids[:20]}'
+                )
+                stale_total += len(stale_ids)
+                if not options['check']:
+                    model.objects.filter(pk__in=stale_ids).update(
+                        **{counter: expression}
+                    )
+        if options['check'] and stale_total:
+            raise CommandError(f'{stale_total} stored counters differ')
+        logger.debug(f'Counters reconciled, {stale_total} fixed\n')
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cart_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    CartIngredient = apps.get_model('recipes', 'CartIngredient')
+    CartIngredient.objects.bulk_create(
+        CartIngredient(
+            user_id=row['recipe__cart__user'],
+            ingredient_id=row['ingredient'],
+            amount=row['total']
+        ) for row in RecipeIngredient.objects.filter(
+            recipe__cart__isnull=False
+        ).values('recipe__cart__user', 'ingredient').annotate(
+            total=models.Sum('amount')
+        ).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Amount')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to='recipes.ingredient', verbose_name='Ingredient')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Cart ingredient',
+                'verbose_name_plural': 'Cart ingredients',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_ingredient'),
+        ),
+        migrations.RunPython(
+            fill_cart_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.16 on 2026-10-18 18:56
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+# The SQL is frozen here, so later changes of recipes.search or of the
+# models cannot change what this migration does.
+INGREDIENT_NAMES_SQL = '''(
+    SELECT {aggregate}(ingredient.name, ' ')
+    FROM recipes_recipeingredient AS amount
+    JOIN recipes_ingredient AS ingredient
+    ON ingredient.id = amount.ingredient_id
+    WHERE amount.recipe_id = recipe.id
+)'''
+POSTGRESQL_CREATE_SQL = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)'
+)
+POSTGRESQL_UPDATE_SQL = f'''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce(
+        {INGREDIENT_NAMES_SQL.format(aggregate='string_agg')}, ''
+    )), 'B') ||
+    setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+'''
+POSTGRESQL_DROP_SQL = 'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin'
+SQLITE_CREATE_SQL = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+    'USING fts5(name, ingredients, text)'
+)
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text)
+    SELECT recipe.id, recipe.name, coalesce(
+        {INGREDIENT_NAMES_SQL.format(aggregate='group_concat')}, ''
+    ), recipe.text
+    FROM recipes_recipe AS recipe
+'''
+SQLITE_DROP_SQL = 'DROP TABLE IF EXISTS recipes_recipe_fts'
+
+
+def fill_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRESQL_CREATE_SQL)
+            cursor.execute(POSTGRESQL_UPDATE_SQL, {
+                'config': getattr(settings, 'SEARCH_CONFIG', 'russian')
+            })
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_CREATE_SQL)
+            cursor.execute('DELETE FROM recipes_recipe_fts')
+            cursor.execute(SQLITE_INSERT_SQL)
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRESQL_DROP_SQL)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search vector'),
+        ),
+        migrations.RunPython(fill_search_index, remove_search_index),
+    ]
@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -57,6 +58,27 @@ class Recipe(models.Model):
         upload_to='images/',
         verbose_name='Image'
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Image variants'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Search vector'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Favorites count'
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Cart count'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -86,9 +108,24 @@ class Recipe(models.Model):
             )
         ]
 
+    COUNTER_FIELDS = ('favorites_count', 'cart_count')
+    UPDATED_FIELDS = (*COUNTER_FIELDS, 'image_variants')
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Counters and image variants are changed only with update() by
+        # F() expressions and the resize workers, so a stale instance
+        # must not write them back.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.UPDATED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class RecipeIngredient(models.Model):
     """Many-to-many model for Recipe and Ingredient instances."""
@@ -182,3 +219,34 @@ class Cart(models.Model):
 
     def __str__(self):
         return f'{self.recipe}_by_{self.user}'
+
+
+class CartIngredient(models.Model):
+    """Per-user ingredient totals of the shopping cart."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='User'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='cart_ingredients',
+        verbose_name='Ingredient'
+    )
+    amount = models.PositiveIntegerField(verbose_name='Amount')
+
+    class Meta:
+        verbose_name = 'Cart ingredient'
+        verbose_name_plural = 'Cart ingredients'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_cart_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient}_for_{self.user}'
@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections, models, transaction
+
+from .models import Ingredient, Recipe, RecipeIngredient
+
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'russian')
+FTS_TABLE = f'{Recipe._meta.db_table}_fts'
+INDEX_NAME = f'{Recipe._meta.db_table}_search_vector_gin'
+
+
+def get_ingredient_names_sql(aggregate):
+    """Return a subquery joining ingredient names of the outer recipe."""
+    return f'''(
+        SELECT {aggregate}(ingredient.name, ' ')
+        FROM {RecipeIngredient._meta.db_table} AS amount
+        JOIN {Ingredient._meta.db_table} AS ingredient
+        ON ingredient.id = amount.ingredient_id
+        WHERE amount.recipe_id = recipe.id
+    )'''
+
+
+POSTGRESQL_UPDATE_SQL = f'''
+    UPDATE {Recipe._meta.db_table} AS recipe SET search_vector =
+    setweight(to_tsvector(%(config)s::regconfig, recipe.name), 'A') ||
+    setweight(to_tsvector(%(config)s::regconfig, coalesce(
+        {get_ingredient_names_sql('string_agg')}, ''
+    )), 'B') ||
+    setweight(to_tsvector(%(config)s::regconfig, recipe.text), 'C')
+'''
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text)
+    SELECT recipe.id, recipe.name, coalesce(
+        {get_ingredient_names_sql('group_concat')}, ''
+    ), recipe.text
+    FROM {Recipe._meta.db_table} AS recipe
+'''
+
+
+def create_search_index(connection):
+    """Create the GIN index on PostgreSQL or the FTS5 table on SQLite."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+                f'ON {Recipe._meta.db_table} USING gin (search_vector)'
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f'USING fts5(name, ingredients, text)'
+            )
+
+
+def drop_search_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def update_search_index(recipes=None, using='default'):
+    """Rebuild search documents of recipes (of all recipes by default).
+
+    Documents of deleted recipes are dropped as well.
+    """
+    connection = connections[using]
+    ids = None if recipes is None else list(recipes)
+    if ids == []:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sql, params = POSTGRESQL_UPDATE_SQL, {'config': SEARCH_CONFIG}
+            if ids is not None:
+                sql += ' WHERE recipe.id = ANY(%(ids)s)'
+                params['ids'] = ids
+            cursor.execute(sql, params)
+        elif connection.vendor == 'sqlite':
+            delete_sql = f'DELETE FROM {FTS_TABLE}'
+            insert_sql = SQLITE_INSERT_SQL
+            if ids is not None:
+                placeholders = ', '.join(['%s'] * len(ids))
+                delete_sql += f' WHERE rowid IN ({placeholders})'
+                insert_sql += f' WHERE recipe.id IN ({placeholders})'
+            cursor.execute(delete_sql, ids)
+            cursor.execute(insert_sql, ids)
+
+
+def schedule_search_update(recipes, using='default'):
+    """Rebuild search documents of recipes once the transaction commits."""
+    ids = list(recipes)
+    transaction.on_commit(
+        lambda: update_search_index(ids, using), using=using
+    )
+
+
+def get_fts_query(value):
+    """Quote every word of value as an FTS5 prefix query term."""
+    words = value.replace('"', ' ').split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_recipes(queryset, value):
+    """Filter recipes matching value and order them by relevance."""
+    connection = connections[queryset.db]
+    ordering = ('-search_rank', *queryset.model._meta.ordering)
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(models.F('search_vector'), query)
+        ).order_by(*ordering)
+    if connection.vendor == 'sqlite':
+        match = get_fts_query(value)
+        if not match:
+            return queryset
+        return queryset.extra(
+            tables=(FTS_TABLE,),
+            where=(
+                f'{FTS_TABLE}.rowid = {Recipe._meta.db_table}.id',
+                f'{FTS_TABLE} MATCH %s',
+            ),
+            params=(match,)
+        ).annotate(search_rank=models.expressions.RawSQL(
+            f'-bm25({FTS_TABLE}, 10.0, 5.0, 1.0)', (),
+            output_field=models.FloatField()
+        )).order_by(*ordering)
+    query = models.Q()
+    for word in value.split():
+        query &= (
+            models.Q(name__icontains=word)
+            | models.Q(text__icontains=word)
+            | models.Q(ingredients__name__icontains=word)
+        )
+    return queryset.filter(
+        id__in=Recipe.objects.filter(query).values('id')
+    )
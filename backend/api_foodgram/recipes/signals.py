@@ -0,0 +1,126 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from .images import schedule_variants_deletion
+from .models import Cart, Ingredient, Recipe, RecipeIngredient, Tag
+from .search import schedule_search_update
+from .tools import (
+    add_handled_deletes, bump_instance_versions, bump_version,
+    get_cart_users, get_recipe_amounts, is_delete_handled,
+    remove_handled_deletes, update_cart_ingredients,
+)
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Tag)
+def change_version(sender, **kwargs):
+    bump_version(sender)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def change_recipe_version(sender, **kwargs):
+    bump_version(Recipe)
+
+
+@receiver(post_save, sender=User)
+def change_author_version(sender, update_fields=None, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS.intersection(update_fields):
+        bump_version(Recipe)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def change_recipe_document(sender, instance, using, **kwargs):
+    schedule_search_update([instance.id], using)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_image_variants(sender, instance, **kwargs):
+    schedule_variants_deletion(instance.image_variants.values())
+
+
+@receiver((post_save, pre_delete), sender=Ingredient)
+def change_ingredient_documents(sender, instance, using, **kwargs):
+    if not kwargs.get('created'):
+        schedule_search_update(
+            instance.amount.values_list('recipe', flat=True), using
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def change_recipe_fragment(sender, instance, **kwargs):
+    bump_instance_versions(Recipe, [instance.id])
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def change_ingredients_fragment(sender, instance, **kwargs):
+    bump_instance_versions(Recipe, [instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def change_tags_fragment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        bump_instance_versions(Recipe, [instance.pk])
+    elif pk_set:
+        bump_instance_versions(Recipe, pk_set)
+    else:
+        bump_instance_versions(
+            Recipe, instance.recipes.values_list('id', flat=True)
+        )
+
+
+@receiver(post_save, sender=User)
+def change_author_fragments(
+        sender, instance, created, update_fields=None, **kwargs
+):
+    if created:
+        return
+    if update_fields is None or AUTHOR_FIELDS.intersection(update_fields):
+        bump_instance_versions(
+            Recipe, instance.recipes.values_list('id', flat=True)
+        )
+
+
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=User)
+def start_deletion(sender, instance, **kwargs):
+    add_handled_deletes((sender, instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def finish_deletion(sender, instance, **kwargs):
+    remove_handled_deletes((sender, instance.pk))
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_carts(sender, instance, **kwargs):
+    """Subtract a deleted recipe from the cart totals of all its users.
+
+    It runs before the cascade, while the recipe ingredients still
+    exist, and the deletions of its cart rows are skipped below.
+    """
+    update_cart_ingredients(
+        get_cart_users(instance), get_recipe_amounts([instance]), -1
+    )
+
+
+@receiver(post_delete, sender=Cart)
+def remove_cart_recipe(sender, instance, **kwargs):
+    if is_delete_handled(
+        sender, (Recipe, instance.recipe_id), (User, instance.user_id)
+    ):
+        return
+    update_cart_ingredients(
+        [instance.user_id], get_recipe_amounts([instance.recipe_id]), -1
+    )
@@ -0,0 +1,203 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import models, transaction
+
+from .models import Cart, CartIngredient, Favorite, Recipe, RecipeIngredient
+from users.models import Follow
+
+User = get_user_model()
+
+handled_deletes = ContextVar('handled_deletes', default=frozenset())
+
+
+def get_recipe_amounts(recipes):
+    """Return total ingredient amounts of recipes keyed by ingredient id."""
+    return dict(
+        RecipeIngredient.objects.filter(
+            recipe__in=recipes
+        ).values('ingredient').annotate(
+            total=models.Sum('amount')
+        ).values_list('ingredient', 'total')
+    )
+
+
+def get_live_cart_amounts():
+    """Aggregate cart totals of all users from RecipeIngredient rows."""
+    return {
+        (user, ingredient): total
+        for user, ingredient, total in RecipeIngredient.objects.filter(
+            recipe__cart__isnull=False
+        ).values('recipe__cart__user', 'ingredient').annotate(
+            total=models.Sum('amount')
+        ).values_list('recipe__cart__user', 'ingredient', 'total')
+    }
+
+
+def get_cart_users(recipe):
+    """Return ids of users who have the recipe in their shopping cart."""
+    return list(Cart.objects.filter(recipe=recipe).values_list(
+        'user', flat=True
+    ))
+
+
+@transaction.atomic
+def update_cart_ingredients(users, amounts, sign=1):
+    """Add (or subtract with sign=-1) ingredient amounts to cart totals.
+
+    Users are locked first, so concurrent cart changes of the same user
+    are applied one after another.
+    """
+    deltas = {key: sign * value for key, value in amounts.items() if value}
+    if not users or not deltas:
+        return
+    list(User.objects.select_for_update().filter(id__in=users).values('id'))
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in CartIngredient.objects.filter(
+            user__in=users, ingredient__in=deltas
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user in users:
+        for ingredient, delta in deltas.items():
+            row = rows.get((user, ingredient))
+            if row is None:
+                if delta > 0:
+                    to_create.append(CartIngredient(
+                        user_id=user, ingredient_id=ingredient, amount=delta
+                    ))
+                continue
+            row.amount += delta
+            if row.amount > 0:
+                to_update.append(row)
+            else:
+                to_delete.append(row.id)
+    CartIngredient.objects.bulk_create(to_create)
+    CartIngredient.objects.bulk_update(to_update, ('amount',))
+    CartIngredient.objects.filter(id__in=to_delete).delete()
+
+
+def add_handled_deletes(*keys):
+    handled_deletes.set(handled_deletes.get() | set(keys))
+
+
+def remove_handled_deletes(*keys):
+    handled_deletes.set(handled_deletes.get() - set(keys))
+
+
+@contextmanager
+def handle_deletes(*keys):
+    """Let delete receivers skip rows whose totals the caller updates.
+
+    Keys are models, for all of their rows, or (model, pk) pairs for
+    rows that point to an instance, e.g. to a recipe being deleted.
+    """
+    token = handled_deletes.set(handled_deletes.get() | set(keys))
+    try:
+        yield
+    finally:
+        handled_deletes.reset(token)
+
+
+def is_delete_handled(model, *pairs):
+    keys = handled_deletes.get()
+    return model in keys or any(pair in keys for pair in pairs)
+
+
+def is_cache_shared():
+    """Tell whether the default cache is seen by every worker process."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def get_version_timeout():
+    """Return how long a content version is kept in the cache.
+
+    A process-local cache does not see versions bumped by other workers,
+    so there versions expire after LOCAL_VERSION_TIMEOUT seconds and are
+    started again, which bounds how long a worker serves stale data.
+    """
+    if is_cache_shared():
+        return None
+    return settings.LOCAL_VERSION_TIMEOUT
+
+
+def get_version(model):
+    """Return the content version of a model as a write timestamp.
+
+    The version lives in the configured cache, so with a shared cache
+    every process sees the same value.
+    """
+    key = f'version:{model._meta.label_lower}'
+    version = cache.get(key)
+    if version is not None:
+        return version
+    version = time.time()
+    cache.add(key, version, timeout=get_version_timeout())
+    return cache.get(key, version)
+
+
+def bump_version(model):
+    """Change the content version of a model once the transaction commits."""
+    transaction.on_commit(lambda: cache.set(
+        f'version:{model._meta.label_lower}', time.time(),
+        timeout=get_version_timeout()
+    ))
+
+
+def get_instance_versions(model, ids):
+    """Return content versions of single model instances keyed by id.
+
+    Missing versions are started at the current time, so data read
+    after this call is never stored under an outdated version.
+    """
+    label = model._meta.label_lower
+    keys = {id: f'version:{label}:{id}' for id in ids}
+    found = cache.get_many(keys.values())
+    missing = {key: time.time() for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=get_version_timeout())
+        found.update(missing)
+    return {id: found[key] for id, key in keys.items()}
+
+
+def bump_instance_versions(model, ids):
+    """Change content versions of model instances after commit."""
+    label = model._meta.label_lower
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(lambda: cache.set_many(
+            {f'version:{label}:{id}': time.time() for id in ids},
+            timeout=get_version_timeout()
+        ))
+
+
+def count_related(model, field):
+    """Return a subquery counting model rows that point to the outer row."""
+    return models.functions.Coalesce(models.Subquery(
+        model.objects.filter(
+            **{field: models.OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=models.Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def get_live_counters():
+    """Map models to expressions that compute their stored counters."""
+    return {
+        Recipe: {
+            'favorites_count': count_related(Favorite, 'recipe'),
+            'cart_count': count_related(Cart, 'recipe'),
+        },
+        User: {
+            'recipes_count': count_related(Recipe, 'author'),
+            'followers_count': count_related(Follow, 'author'),
+        },
+    }
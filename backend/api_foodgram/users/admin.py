@@ -9,6 +9,7 @@ User = get_user_model()
 class UserAdmin(admin.ModelAdmin):
     """Custom User admin panel."""
 
+    list_display = ('username', 'email', 'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
 
 
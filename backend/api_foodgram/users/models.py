@@ -38,9 +38,20 @@ class User(AbstractUser):
         default=USER,
         verbose_name='Role'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Recipes count'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Followers count'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
 
     class Meta:
         verbose_name = 'User'
@@ -49,7 +60,17 @@ class User(AbstractUser):
 
     @property
     def is_admin(self):
-        return self.role == self.Roles.ADMIN or self.is_superuser
+        return self.role == self.ADMIN or self.is_superuser
+
+    def save(self, *args, **kwargs):
+        # Keep counters out of full saves, e.g. on login or password change.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 
 class Follow(models.Model):
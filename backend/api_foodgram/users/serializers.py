@@ -2,13 +2,17 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
-from .models import Follow
+from .tools import get_recipes_limit, get_subscriptions
+from api.fields import ImageVariantField
+from api.mixins import SparseFieldsSerializerMixin
 from recipes.models import Recipe
 
 User = get_user_model()
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(
+    SparseFieldsSerializerMixin, serializers.ModelSerializer
+):
     """A serializer to read User instances."""
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
@@ -21,14 +25,15 @@ class CustomUserSerializer(serializers.ModelSerializer):
             'username',
             'first_name',
             'last_name',
-            'is_subscribed'
+            'is_subscribed',
+            'recipes_count',
+            'followers_count'
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return Follow.objects.filter(author=obj, user=request.user).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_subscriptions(self.context.get('request'))
 
 
 class CustomUserCreateSerializer(serializers.ModelSerializer):
@@ -64,22 +69,17 @@ class CustomUserCreateSerializer(serializers.ModelSerializer):
 class FollowRecipeSerializer(serializers.ModelSerializer):
     """A serializer for Follow instance to read recipes."""
 
+    image = ImageVariantField(variant='thumbnail')
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FollowSerializer(serializers.ModelSerializer):
-    """A serializer to read Followers."""
+class FollowSerializer(CustomUserSerializer):
+    """A serializer to read followed authors with their recipes."""
 
-    id = serializers.ReadOnlyField(source='author.id')
-    email = serializers.ReadOnlyField(source='author.email')
-    username = serializers.ReadOnlyField(source='author.username')
-    first_name = serializers.ReadOnlyField(source='author.first_name')
-    last_name = serializers.ReadOnlyField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = User
@@ -91,15 +91,15 @@ class FollowSerializer(serializers.ModelSerializer):
             'last_name',
             'is_subscribed',
             'recipes',
-            'recipes_count'
+            'recipes_count',
+            'followers_count'
         )
 
-    def get_is_subscribed(self, obj):
-        return Follow.objects.filter(author=obj.author, user=obj.user).exists()
-
     def get_recipes(self, obj):
-        queryset = Recipe.objects.filter(author=obj.author)
+        if hasattr(obj, 'limited_recipes'):
+            queryset = obj.limited_recipes
+        else:
+            queryset = obj.recipes.all()[
+                :get_recipes_limit(self.context.get('request'))
+            ]
         return FollowRecipeSerializer(queryset, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
@@ -1,8 +1,12 @@
+from django.db import models, transaction
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
 
+from api.tools import change_counter
 
+
+@transaction.atomic
 def create_follow(
         user_model, follow_model, instance_serializer, request, id
 ):
@@ -18,11 +22,16 @@ def create_follow(
             author=author,
             user=request.user
         )
-        serializer = instance_serializer(follow)
+        change_counter(user_model, author.id, 'followers_count', 1)
+        follow.author.refresh_from_db(fields=('followers_count',))
+        serializer = instance_serializer(
+            follow.author, context={'request': request}
+        )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
+@transaction.atomic
 def destroy_follow(user_model, follow_model, request, id):
     author = get_object_or_404(user_model, id=id)
     if author == request.user:
@@ -35,3 +44,43 @@ def destroy_follow(user_model, follow_model, request, id):
         follow_model.objects.filter(author=author, user=request.user).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+def get_subscriptions(request):
+    """Return ids of authors followed by the request user.
+
+    The set is loaded once and memoized on the request, so every
+    is_subscribed in a response costs a single query.
+    """
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    if not hasattr(request, 'subscriptions'):
+        request.subscriptions = set(
+            request.user.follower.values_list('author_id', flat=True)
+        )
+    return request.subscriptions
+
+
+def get_recipes_limit(request):
+    """Return a positive recipes_limit query parameter or None."""
+    if request is None:
+        return None
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit > 0 else None
+
+
+def get_limited_recipes(recipe_model, limit):
+    """Return a queryset to prefetch at most limit recipes per author."""
+    queryset = recipe_model.objects.only(
+        'id', 'name', 'image', 'image_variants', 'cooking_time', 'author'
+    )
+    if limit is None:
+        return queryset
+    return queryset.filter(id__in=models.Subquery(
+        recipe_model.objects.filter(
+            author=models.OuterRef('author')
+        ).values('id')[:limit]
+    ))
@@ -1,25 +1,73 @@
 from django.contrib.auth import get_user_model
+from django.db import models
 from djoser.views import UserViewSet
 from rest_framework.decorators import action
 
 from .serializers import CustomUserSerializer, FollowSerializer
-from .tools import create_follow, destroy_follow
+from .tools import (
+    create_follow, destroy_follow, get_limited_recipes, get_recipes_limit,
+)
+from api.mixins import SparseFieldsMixin
+from api.pagination import FlexiblePagination
+from api.readonly import ReadOnlyUserSerializer
+from recipes.models import Recipe
 from users.models import Follow
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(SparseFieldsMixin, UserViewSet):
     """A viewset for viewing User instances."""
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
+    pagination_class = FlexiblePagination
+    sparse_serializer_class = CustomUserSerializer
+    sparse_actions = ('list', 'retrieve', 'me', 'subscriptions')
+    sparse_columns = {
+        name: (name,) for name in FollowSerializer.Meta.fields
+        if name not in ('is_subscribed', 'recipes')
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        return queryset.only(*self.get_sparse_columns(fields))
+
+    def get_serializer_class(self):
+        if self.action == 'list' and self.request.method == 'GET':
+            return ReadOnlyUserSerializer
+        return super().get_serializer_class()
+
+    def get_instance(self):
+        # request.user may come from the token cache with stale counters.
+        return self.get_queryset().get(pk=self.request.user.pk)
 
     @action(detail=False, methods=['get'])
     def subscriptions(self, request):
-        queryset = Follow.objects.filter(user=request.user)
+        fields = self.get_sparse_fields(FollowSerializer)
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            is_subscribed=models.Value(True, models.BooleanField())
+        )
+        if fields is not None:
+            queryset = queryset.only(*self.get_sparse_columns(fields))
+        if fields is None or 'recipes' in fields:
+            queryset = queryset.prefetch_related(models.Prefetch(
+                'recipes',
+                queryset=get_limited_recipes(
+                    Recipe, get_recipes_limit(request)
+                ),
+                to_attr='limited_recipes'
+            ))
         page = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(page, many=True)
+        serializer = FollowSerializer(
+            page, many=True,
+            context={'request': request, 'sparse_fields': fields}
+        )
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post', 'delete'])